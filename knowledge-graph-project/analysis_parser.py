@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+import copy
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from lxml import etree as ET
+
+DEFAULT_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.xsd')
+
+XSD_NAMESPACE = 'http://www.w3.org/2001/XMLSchema'
+
+# Placeholder stored when the model returns a relationship without properties
+DEFAULT_PROPERTIES = {'default': 'No additional properties'}
+
+# Stand-in values for fields a salvaged element is missing or got wrong
+SALVAGE_CONFIDENCE = 0.5
+SALVAGE_CONCEPT_TYPE = 'unknown'
+SALVAGE_RELATIONSHIP_TYPE = 'related_to'
+SALVAGE_EXTRACTION_METHOD = 'deepseek_analysis'
+
+NUMBER_PATTERN = re.compile(r'-?\d+(?:\.\d+)?')
+
+
+@dataclass(slots=True)
+class Concept:
+    """A concept extracted from a chunk, flattened to its Neo4j properties"""
+    name: str
+    type: str
+    description: str
+    confidence: float
+    source_position: int = None
+    source_context: str = None
+    hierarchy_parent: str = None
+    hierarchy_level: int = 0
+    version: int = 1
+    references: list = field(default_factory=list)
+    aliases: list = field(default_factory=list)
+
+    def to_row(self):
+        """Parameters for one UNWIND row"""
+        return {
+            'name': self.name,
+            'type': self.type,
+            'description': self.description,
+            'confidence': self.confidence,
+            'source_position': self.source_position,
+            'source_context': self.source_context,
+            'hierarchy_parent': self.hierarchy_parent,
+            'hierarchy_level': self.hierarchy_level,
+            'version': self.version,
+            'references': self.references,
+            'aliases': self.aliases
+        }
+
+
+@dataclass(slots=True)
+class Relationship:
+    """A relationship extracted from a chunk, flattened to its Neo4j properties"""
+    source: str
+    type: str
+    target: str
+    confidence: float
+    forward_strength: float = None
+    backward_strength: float = None
+    first_seen: str = None
+    last_seen: str = None
+    category: str = None
+    directness: str = None
+    strength: str = None
+    source_context: str = None
+    extraction_method: str = None
+    properties: dict = field(default_factory=lambda: dict(DEFAULT_PROPERTIES))
+
+    def to_row(self):
+        """Parameters for one UNWIND row"""
+        return {
+            'source': self.source,
+            'type': self.type,
+            'target': self.target,
+            'confidence': self.confidence,
+            'forward_strength': self.forward_strength,
+            'backward_strength': self.backward_strength,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'category': self.category,
+            'directness': self.directness,
+            'strength': self.strength,
+            'source_context': self.source_context,
+            'extraction_method': self.extraction_method,
+            'properties': self.properties
+        }
+
+
+@dataclass(slots=True)
+class Analysis:
+    """Concepts and relationships extracted from one chunk
+
+    ``salvaged`` marks a response that failed validation and was recovered;
+    ``repairs`` and ``dropped`` count the fields that were defaulted and the
+    elements that were lost.
+    """
+    concepts: list
+    relationships: list
+    repairs: int = 0
+    dropped: int = 0
+    salvaged: bool = False
+
+
+def ensure_integer_position(position, default=None):
+    """Convert position to integer, returning ``default`` if not a valid integer"""
+    try:
+        return int(position)
+    except (ValueError, TypeError):
+        return default
+
+
+def element_to_concept(element):
+    """Convert a <concept> element into a ``Concept`` in one pass over its children"""
+    values = {}
+    references = []
+    for child in element:
+        tag = child.tag
+        if tag == 'source':
+            for part in child:
+                if part.tag == 'position':
+                    values['source_position'] = ensure_integer_position(part.text)
+                elif part.tag == 'context':
+                    values['source_context'] = part.text
+        elif tag == 'hierarchy':
+            for part in child:
+                if part.tag == 'parent':
+                    values['hierarchy_parent'] = part.text
+                elif part.tag == 'level':
+                    values['hierarchy_level'] = int(part.text)
+        elif tag == 'references':
+            references = [ref.text for ref in child]
+        elif tag == 'confidence':
+            values['confidence'] = float(child.text)
+        elif tag == 'version':
+            values['version'] = int(child.text)
+        elif tag in ('name', 'type', 'description'):
+            values[tag] = child.text
+    return Concept(references=references, **values)
+
+
+def element_to_relationship(element):
+    """Convert a <relationship> element into a ``Relationship`` in one pass over its children"""
+    values = {}
+    properties = {}
+    for child in element:
+        tag = child.tag
+        if tag == 'metadata':
+            for part in child:
+                if part.tag == 'confidence':
+                    values['confidence'] = float(part.text)
+                elif part.tag == 'bidirectional_strength':
+                    for leaf in part:
+                        values[f'{leaf.tag}_strength'] = float(leaf.text)
+                elif part.tag in ('temporal', 'classification', 'provenance'):
+                    for leaf in part:
+                        values[leaf.tag] = leaf.text
+        elif tag == 'properties':
+            properties = {prop.get('name'): prop.text for prop in child}
+        elif tag in ('source', 'type', 'target'):
+            values[tag] = child.text
+    return Relationship(properties=properties or dict(DEFAULT_PROPERTIES), **values)
+
+
+class _Salvager:
+    """Lenient per-element conversion that repairs fields instead of failing"""
+
+    def __init__(self):
+        self.repairs = 0
+
+    def text(self, element, path, default=None):
+        found = element.find(path)
+        value = found.text.strip() if found is not None and found.text else ''
+        if value:
+            return value
+        if default is not None:
+            self.repairs += 1
+        return default
+
+    def number(self, element, path, default):
+        value = self.text(element, path)
+        match = NUMBER_PATTERN.search(value or '')
+        if match is None:
+            self.repairs += 1
+            return default
+        number = float(match.group())
+        if not 0.0 <= number <= 1.0 or match.group() != value:
+            self.repairs += 1
+        return min(1.0, max(0.0, number))
+
+    def integer(self, element, path, default):
+        value = ensure_integer_position(self.text(element, path))
+        if value is None:
+            self.repairs += 1
+            return default
+        return value
+
+    def timestamp(self, element, path, default):
+        value = self.text(element, path)
+        try:
+            datetime.fromisoformat(value.replace('Z', '+00:00'))
+            return value
+        except (AttributeError, ValueError):
+            self.repairs += 1
+            return default
+
+    def concept(self, element):
+        name = self.text(element, 'name')
+        if name is None:
+            return None
+        return Concept(
+            name=name,
+            type=self.text(element, 'type', SALVAGE_CONCEPT_TYPE),
+            description=self.text(element, 'description', ''),
+            confidence=self.number(element, 'confidence', SALVAGE_CONFIDENCE),
+            source_position=ensure_integer_position(self.text(element, 'source/position')),
+            source_context=self.text(element, 'source/context'),
+            hierarchy_parent=self.text(element, 'hierarchy/parent'),
+            hierarchy_level=self.integer(element, 'hierarchy/level', 0),
+            version=self.integer(element, 'version', 1),
+            references=[ref.text.strip() for ref in element.findall('references/reference')
+                        if ref.text and ref.text.strip()]
+        )
+
+    def relationship(self, element):
+        source = self.text(element, 'source')
+        target = self.text(element, 'target')
+        if source is None or target is None:
+            return None
+        now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        confidence = self.number(element, 'metadata/confidence', SALVAGE_CONFIDENCE)
+        first_seen = self.timestamp(element, 'metadata/temporal/first_seen', now)
+        properties = {
+            prop.get('name'): prop.text
+            for prop in element.findall('properties/property')
+            if prop.get('name')
+        }
+        return Relationship(
+            source=source,
+            type=self.text(element, 'type', SALVAGE_RELATIONSHIP_TYPE),
+            target=target,
+            confidence=confidence,
+            forward_strength=self.number(
+                element, 'metadata/bidirectional_strength/forward', confidence),
+            backward_strength=self.number(
+                element, 'metadata/bidirectional_strength/backward', confidence),
+            first_seen=first_seen,
+            last_seen=self.timestamp(element, 'metadata/temporal/last_seen', first_seen),
+            category=self.text(element, 'metadata/classification/category'),
+            directness=self.text(element, 'metadata/classification/directness'),
+            strength=self.text(element, 'metadata/classification/strength'),
+            source_context=self.text(element, 'metadata/provenance/source_context'),
+            extraction_method=self.text(element, 'metadata/provenance/extraction_method',
+                                        SALVAGE_EXTRACTION_METHOD),
+            properties=properties or dict(DEFAULT_PROPERTIES)
+        )
+
+
+def salvage_element(element):
+    """Leniently convert one <concept> or <relationship> element
+
+    Returns ``(record, repairs)``; ``record`` is None when the element lacks
+    the fields it is keyed on (a concept's name, a relationship's endpoints).
+    """
+    salvager = _Salvager()
+    if element.tag == 'concept':
+        record = salvager.concept(element)
+    else:
+        record = salvager.relationship(element)
+    return record, salvager.repairs
+
+
+def _element_schema(schema_doc, name):
+    """Compile the declaration of ``name`` in ``schema_doc`` as a schema of its own"""
+    declaration = copy.deepcopy(
+        schema_doc.find(f'.//{{{XSD_NAMESPACE}}}element[@name="{name}"]')
+    )
+    declaration.attrib.pop('maxOccurs', None)
+    declaration.attrib.pop('minOccurs', None)
+    root = ET.Element(f'{{{XSD_NAMESPACE}}}schema', nsmap={'xs': XSD_NAMESPACE})
+    root.append(declaration)
+    return ET.XMLSchema(root)
+
+
+class AnalysisParser:
+    """Validates and extracts an <analysis> response in a single parse.
+
+    The XSD is compiled once and attached to the parser, so validation
+    happens while the document is built and extraction walks the validated
+    tree without any further lookups.  lxml parsers must not be shared
+    between threads, so each thread gets its own parser around the shared
+    compiled schema.
+    """
+
+    def __init__(self, schema_path=DEFAULT_SCHEMA_PATH):
+        schema_doc = ET.parse(schema_path)
+        self.schema = ET.XMLSchema(schema_doc)
+        self.element_schemas = {
+            'concept': _element_schema(schema_doc, 'concept'),
+            'relationship': _element_schema(schema_doc, 'relationship')
+        }
+        self._local = threading.local()
+
+    @property
+    def _parser(self):
+        parser = getattr(self._local, 'parser', None)
+        if parser is None:
+            parser = self._local.parser = ET.XMLParser(schema=self.schema)
+        return parser
+
+    def parse(self, xml_content):
+        """Return an ``Analysis``, raising ValueError if the XML is invalid"""
+        try:
+            root = ET.fromstring(xml_content.encode('utf-8'), self._parser)
+        except ET.XMLSyntaxError as e:
+            raise ValueError(f"Invalid XML response: {e}") from e
+        concepts = []
+        relationships = []
+        for section in root:
+            if section.tag == 'concepts':
+                concepts = [element_to_concept(element) for element in section]
+            elif section.tag == 'relationships':
+                relationships = [element_to_relationship(element) for element in section]
+        return Analysis(concepts, relationships)
+
+    def salvage(self, xml_content):
+        """Recover what can be used from a response that failed validation
+
+        The response is re-read with lxml's recovering parser, which keeps
+        everything up to a truncation or stray markup.  Each <concept> and
+        <relationship> is then validated on its own: valid elements are
+        converted as usual, invalid ones are repaired field by field, and
+        elements missing their key fields are dropped.
+        """
+        parser = getattr(self._local, 'recover_parser', None)
+        if parser is None:
+            parser = self._local.recover_parser = ET.XMLParser(recover=True)
+        root = ET.fromstring(xml_content.encode('utf-8'), parser)
+        analysis = Analysis([], [], salvaged=True)
+        if root is None:
+            return analysis
+        converters = {'concept': element_to_concept, 'relationship': element_to_relationship}
+        for element in root.iter('concept', 'relationship'):
+            if self.element_schemas[element.tag].validate(element):
+                record, repairs = converters[element.tag](element), 0
+            else:
+                record, repairs = salvage_element(element)
+            if record is None:
+                analysis.dropped += 1
+                continue
+            analysis.repairs += repairs
+            if element.tag == 'concept':
+                analysis.concepts.append(record)
+            else:
+                analysis.relationships.append(record)
+        return analysis
+
+    def is_valid(self, xml_content):
+        """Whether ``xml_content`` validates against the schema"""
+        try:
+            ET.fromstring(xml_content.encode('utf-8'), self._parser)
+            return True
+        except ET.XMLSyntaxError:
+            return False
+
+
+_parsers = {}
+_parsers_lock = threading.Lock()
+
+
+def get_parser(schema_path=DEFAULT_SCHEMA_PATH):
+    """Return the process-wide parser for ``schema_path``, compiling it on first use"""
+    with _parsers_lock:
+        parser = _parsers.get(schema_path)
+        if parser is None:
+            parser = _parsers[schema_path] = AnalysisParser(schema_path)
+        return parser
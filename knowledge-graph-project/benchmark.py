@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""Offline throughput benchmark for process_document.
+
+Runs the real ingestion pipeline against local stand-ins: a fake
+OpenAI-compatible client that replays recorded or synthetic XML responses
+with configurable latency, and a Neo4j driver that records the Cypher it is
+sent instead of talking to a server.  Reports chunks/sec, per-stage latency
+percentiles and peak memory for synthetic documents of increasing size.
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+# The pipeline builds its API client at import time; no request is ever sent
+os.environ.setdefault("DEEPSEEK_API_KEY", "benchmark")
+
+import chunker
+import neo4j_connection
+import process_document as pd
+from response_formats import RESPONSE_FORMATS, get_response_format
+
+WORD_PATTERN = re.compile(r'[A-Za-z][A-Za-z0-9_-]{5,}')
+
+CONCEPT_TEMPLATE = """<concept><name>{name}</name><type>term</type><description>Synthetic concept {name}</description><confidence>0.9</confidence><source><position>{position}</position><context>{name}</context></source><hierarchy><parent>{parent}</parent><level>1</level></hierarchy><version>1</version><references><reference>{parent}</reference></references></concept>"""
+
+RELATIONSHIP_TEMPLATE = """<relationship><source>{source}</source><type>relates_to</type><target>{target}</target><metadata><confidence>0.8</confidence><bidirectional_strength><forward>0.7</forward><backward>0.6</backward></bidirectional_strength><temporal><first_seen>2024-01-26T13:45:00Z</first_seen><last_seen>2024-01-26T13:45:00Z</last_seen></temporal><classification><category>association</category><directness>direct</directness><strength>moderate</strength></classification><provenance><source_context>synthetic</source_context><extraction_method>deepseek_analysis</extraction_method></provenance></metadata><properties><property name="benchmark">true</property></properties></relationship>"""
+
+
+def synthetic_response(chunk_text, concepts_per_chunk):
+    """Build a schema-valid analysis whose concepts are words from the chunk"""
+    names = []
+    for match in WORD_PATTERN.finditer(chunk_text):
+        if match.group(0) not in names:
+            names.append(match.group(0))
+        if len(names) == concepts_per_chunk:
+            break
+    if len(names) < 2:
+        names = (names + ['Placeholder', 'Filler'])[:2]
+    concepts = ''.join(
+        CONCEPT_TEMPLATE.format(name=name, position=chunk_text.find(name), parent=names[0])
+        for name in names
+    )
+    relationships = ''.join(
+        RELATIONSHIP_TEMPLATE.format(source=source, target=target)
+        for source, target in zip(names, names[1:])
+    )
+    return (f"<analysis><concepts>{concepts}</concepts>"
+            f"<relationships>{relationships}</relationships></analysis>")
+
+
+def synthetic_compact_response(chunk_text, concepts_per_chunk):
+    """The compact JSON equivalent of ``synthetic_response``"""
+    names = []
+    for match in WORD_PATTERN.finditer(chunk_text):
+        if match.group(0) not in names:
+            names.append(match.group(0))
+        if len(names) == concepts_per_chunk:
+            break
+    if len(names) < 2:
+        names = (names + ['Placeholder', 'Filler'])[:2]
+    return json.dumps({
+        'concepts': [
+            [name, 'term', f'Synthetic concept {name}', 0.9, chunk_text.find(name), names[0], 1,
+             [names[0]]]
+            for name in names
+        ],
+        'relationships': [
+            [source, 'relates_to', target, 0.8, 0.7, 0.6, 'association', 'direct', 'moderate']
+            for source, target in zip(names, names[1:])
+        ]
+    }, separators=(',', ':'))
+
+
+class FakeCompletions:
+    """Stand-in for ``client.chat.completions`` with simulated latency.
+
+    Latency is ``base_latency`` plus ``token_latency`` per output token,
+    spread across the deltas when streaming.  Responses come from
+    ``replay`` (a list of recorded XML bodies, used round-robin) or are
+    synthesized from the chunk text, as compact JSON when JSON mode is
+    requested.
+    """
+
+    def __init__(self, base_latency=0.5, token_latency=0.002, replay=None, concepts_per_chunk=8):
+        self.base_latency = base_latency
+        self.token_latency = token_latency
+        self.replay = replay or []
+        self.concepts_per_chunk = concepts_per_chunk
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _content(self, messages, compact=False):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        chunk_text = messages[-1]['content'].split('Chunk: ', 1)[-1]
+        if compact:
+            return synthetic_compact_response(chunk_text, self.concepts_per_chunk)
+        if self.replay:
+            return self.replay[(call - 1) % len(self.replay)]
+        return synthetic_response(chunk_text, self.concepts_per_chunk)
+
+    def create(self, model, messages, stream=False, response_format=None, **kwargs):
+        compact = (response_format or {}).get('type') == 'json_object'
+        content = self._content(messages, compact)
+        output_tokens = chunker.estimate_tokens(content)
+        prompt_tokens = sum(chunker.estimate_tokens(m['content']) for m in messages)
+        usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=output_tokens,
+            total_tokens=prompt_tokens + output_tokens
+        )
+        time.sleep(self.base_latency)
+        if stream:
+            include_usage = (kwargs.get('stream_options') or {}).get('include_usage')
+            return self._stream(content, usage if include_usage else None)
+        time.sleep(self.token_latency * output_tokens)
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    def _stream(self, content, usage=None, delta_size=16):
+        for start in range(0, len(content), delta_size):
+            delta = content[start:start + delta_size]
+            time.sleep(self.token_latency * chunker.estimate_tokens(delta))
+            choice = SimpleNamespace(delta=SimpleNamespace(content=delta))
+            yield SimpleNamespace(choices=[choice], usage=None)
+        if usage is not None:
+            # Like the API with include_usage: a last event with usage and no choices
+            yield SimpleNamespace(choices=[], usage=usage)
+
+
+class FakeChatClient:
+    """OpenAI-compatible client exposing ``chat.completions.create``"""
+
+    def __init__(self, **options):
+        self.chat = SimpleNamespace(completions=FakeCompletions(**options))
+
+
+class RecordingTransaction:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def run(self, query, parameters=None, **kwargs):
+        params = dict(parameters or {}, **kwargs)
+        rows = params.get('rows')
+        with self.driver.lock:
+            self.driver.statements += 1
+            self.driver.rows += len(rows) if rows is not None else 1
+            if self.driver.record:
+                self.driver.queries.append((query, params))
+        time.sleep(self.driver.statement_latency)
+        return SimpleNamespace(consume=lambda: None, data=lambda: [], single=lambda: None)
+
+
+class RecordingSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, parameters=None, **kwargs):
+        return RecordingTransaction(self.driver).run(query, parameters, **kwargs)
+
+    def execute_write(self, work, *args, **kwargs):
+        result = work(RecordingTransaction(self.driver), *args, **kwargs)
+        with self.driver.lock:
+            self.driver.transactions += 1
+        time.sleep(self.driver.commit_latency)
+        return result
+
+    execute_read = execute_write
+
+
+class RecordingDriver:
+    """In-process Neo4j driver stand-in that counts and optionally records Cypher"""
+
+    def __init__(self, statement_latency=0.002, commit_latency=0.005, record=False):
+        self.statement_latency = statement_latency
+        self.commit_latency = commit_latency
+        self.record = record
+        self.lock = threading.Lock()
+        self.statements = 0
+        self.transactions = 0
+        self.rows = 0
+        self.queries = []
+
+    def session(self, **kwargs):
+        return RecordingSession(self)
+
+    def close(self):
+        pass
+
+
+class RecordingNeo4jConnection(neo4j_connection.Neo4jConnection):
+    """Neo4jConnection running its real query code against a RecordingDriver"""
+
+    def __init__(self, driver, **kwargs):
+        self._recording_driver = driver
+        super().__init__(**kwargs)
+
+    def connect(self):
+        self.driver = self._recording_driver
+
+
+class StageTimer:
+    """Collects wall-clock durations per pipeline stage"""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, stage, function):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.samples.setdefault(stage, []).append(elapsed)
+        return timed
+
+    def wrap_generator(self, stage, function):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                yield from function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.samples.setdefault(stage, []).append(elapsed)
+        return timed
+
+    def summary(self):
+        return {
+            stage: {
+                'count': len(values),
+                'p50_ms': percentile(values, 50) * 1000,
+                'p99_ms': percentile(values, 99) * 1000,
+                'total_s': sum(values)
+            }
+            for stage, values in sorted(self.samples.items())
+        }
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def write_synthetic_document(path, size_bytes, seed=0):
+    """Write a Markdown document of about ``size_bytes`` with sections and paragraphs"""
+    vocabulary = [
+        'workitem', 'backlog', 'iteration', 'sprint', 'pipeline', 'repository',
+        'dashboard', 'query', 'taskboard', 'capacity', 'velocity', 'epic',
+        'feature', 'requirement', 'acceptance', 'criteria', 'permission',
+        'project', 'process', 'template', 'inheritance', 'field', 'state',
+        'transition', 'notification', 'analytics', 'burndown', 'cumulative'
+    ]
+    written = 0
+    section = 0
+    with open(path, 'w') as f:
+        while written < size_bytes:
+            section += 1
+            heading = f"\n## Section {section}: {vocabulary[(section + seed) % len(vocabulary)].title()}Concept{section}\n\n"
+            f.write(heading)
+            written += len(heading)
+            for paragraph in range(3):
+                words = [
+                    vocabulary[(section * 7 + paragraph * 3 + i + seed) % len(vocabulary)]
+                    for i in range(60)
+                ]
+                words[0] = f"Component{section}x{paragraph}"
+                text = ' '.join(words) + '.\n\n'
+                f.write(text)
+                written += len(text)
+
+
+def run_case(document, mode, args, replay):
+    """Process one document in one mode and return its measurements"""
+    timer = StageTimer()
+    driver = RecordingDriver(args.statement_latency, args.commit_latency, record=args.record_cypher)
+    fake = FakeChatClient(
+        base_latency=args.latency,
+        token_latency=args.token_latency,
+        replay=replay,
+        concepts_per_chunk=args.concepts_per_chunk
+    )
+    connection = RecordingNeo4jConnection(driver)
+    connection.write_chunk_results = timer.wrap('neo4j_write', connection.write_chunk_results)
+    fake.chat.completions.create = timer.wrap('llm_call', fake.chat.completions.create)
+    pd.client = fake
+    pd.configure_llm(max_concurrency=max(1, args.concurrency))
+
+    originals = {
+        'parse_response': pd.parse_response,
+        'analyze_document_chunk': pd.analyze_document_chunk,
+        'stream_document_chunk': pd.stream_document_chunk,
+        'update_context': pd.update_context,
+    }
+    pd.parse_response = timer.wrap('parse', originals['parse_response'])
+    pd.analyze_document_chunk = timer.wrap('chunk_total', originals['analyze_document_chunk'])
+    pd.stream_document_chunk = timer.wrap_generator('chunk_total', originals['stream_document_chunk'])
+    pd.update_context = timer.wrap('update_context', originals['update_context'])
+
+    options = {'max_tokens': args.max_tokens}
+    if mode == 'pipelined':
+        options.update(concurrency=args.concurrency, ordering='throughput')
+    elif mode == 'stream':
+        options.update(stream=True)
+
+    pd.response_format = get_response_format(args.format)
+    pd.metrics.snapshot(reset=True)
+    with tempfile.TemporaryDirectory() as manifest_dir:
+        manifest_path = os.path.join(manifest_dir, 'manifest.json')
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            result = pd.process_document(
+                document,
+                manifest_path=manifest_path,
+                neo4j=connection,
+                **options
+            )
+        finally:
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            for name, function in originals.items():
+                setattr(pd, name, function)
+        with open(manifest_path) as f:
+            statuses = [entry['status'] for entry in json.load(f)['chunks'].values()]
+
+    chunks = result['chunks_done'] + result['chunks_failed']
+    return {
+        'document': os.path.basename(document),
+        'bytes': os.path.getsize(document),
+        'mode': mode,
+        'format': args.format,
+        'chunks': chunks,
+        'failed': result['chunks_failed'],
+        'status': result['status'],
+        'manifest_done': statuses.count('done'),
+        'seconds': elapsed,
+        'chunks_per_sec': chunks / elapsed if elapsed else 0.0,
+        'peak_memory_mb': peak / (1024 * 1024),
+        'llm_calls': fake.chat.completions.calls,
+        'neo4j_transactions': driver.transactions,
+        'neo4j_statements': driver.statements,
+        'neo4j_rows': driver.rows,
+        'stages': timer.summary(),
+        'counters': pd.metrics.summary()['counters']
+    }
+
+
+def print_report(results):
+    print(f"\n{'document':<24}{'mode':<11}{'chunks':>7}{'secs':>9}{'chunks/s':>10}{'peak MB':>9}{'tx':>6}")
+    for r in results:
+        print(f"{r['document']:<24}{r['mode']:<11}{r['chunks']:>7}{r['seconds']:>9.2f}"
+              f"{r['chunks_per_sec']:>10.2f}{r['peak_memory_mb']:>9.1f}{r['neo4j_transactions']:>6}")
+        for stage, stats in r['stages'].items():
+            print(f"    {stage:<16} n={stats['count']:<6} p50={stats['p50_ms']:8.1f}ms "
+                  f"p99={stats['p99_ms']:8.1f}ms total={stats['total_s']:7.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline ingestion benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20_000, 100_000, 500_000],
+                        help="Synthetic document sizes in bytes")
+    parser.add_argument("--modes", nargs="+", choices=["serial", "pipelined", "stream"],
+                        default=["serial", "pipelined", "stream"])
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="In-flight analyses for the pipelined mode (default: 4)")
+    parser.add_argument("--max-tokens", type=int, default=1000, help="Chunk token budget")
+    parser.add_argument("--latency", type=float, default=0.2,
+                        help="Simulated base LLM latency per call in seconds")
+    parser.add_argument("--token-latency", type=float, default=0.0005,
+                        help="Simulated LLM latency per output token in seconds")
+    parser.add_argument("--statement-latency", type=float, default=0.002,
+                        help="Simulated Neo4j latency per statement in seconds")
+    parser.add_argument("--commit-latency", type=float, default=0.005,
+                        help="Simulated Neo4j latency per commit in seconds")
+    parser.add_argument("--concepts-per-chunk", type=int, default=8)
+    parser.add_argument("--format", choices=sorted(RESPONSE_FORMATS), default="xml",
+                        help="Response format requested from the fake model (default: xml)")
+    parser.add_argument("--replay", help="Directory of recorded XML responses to replay")
+    parser.add_argument("--record-cypher", action="store_true",
+                        help="Keep every Cypher statement and its parameters in memory")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Only log warnings from the pipeline")
+    args = parser.parse_args()
+
+    if args.quiet:
+        pd.logger.setLevel("WARNING")
+
+    replay = []
+    if args.replay:
+        for path in sorted(glob.glob(os.path.join(args.replay, '*.xml'))):
+            with open(path) as f:
+                replay.append(f.read())
+        if not replay:
+            sys.exit(f"No *.xml responses found in {args.replay}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            document = os.path.join(workdir, f"synthetic_{size}.md")
+            write_synthetic_document(document, size)
+            for mode in args.modes:
+                results.append(run_case(document, mode, args, replay))
+
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    # Nothing can fail against the stand-ins, so any failure is a pipeline bug
+    broken = [r for r in results if r['failed'] or r['manifest_done'] != r['chunks']]
+    for r in broken:
+        print(f"{r['document']} ({r['mode']}): status {r['status']}, {r['failed']} chunks failed, "
+              f"{r['manifest_done']}/{r['chunks']} done in the manifest", file=sys.stderr)
+    sys.exit(1 if broken else 0)
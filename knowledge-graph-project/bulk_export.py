@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+import csv
+import glob
+import json
+import os
+import threading
+import uuid
+
+from metrics import metrics
+
+# Mounted into the container as /var/lib/neo4j/import by docker-compose.yml
+DEFAULT_IMPORT_DIR = os.getenv(
+    'NEO4J_IMPORT_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'neo4j', 'import')
+)
+
+CONCEPTS_FILE = 'concepts.csv'
+RELATIONSHIPS_FILE = 'relationships.csv'
+PARTS_DIR = 'parts'
+
+# Separates list elements inside one CSV field; pass the same character to
+# neo4j-admin as --array-delimiter
+ARRAY_DELIMITER = '|'
+
+# Header columns in neo4j-admin import syntax.  LOAD CSV reads the same files
+# and addresses the columns by these names.
+CONCEPT_COLUMNS = [
+    ('name:ID(Concept)', 'name'),
+    ('type', 'type'),
+    ('description', 'description'),
+    ('confidence:float', 'confidence'),
+    ('source_position:int', 'source_position'),
+    ('source_context', 'source_context'),
+    ('hierarchy_parent', 'hierarchy_parent'),
+    ('hierarchy_level:int', 'hierarchy_level'),
+    ('version:int', 'version'),
+    ('references:string[]', 'references'),
+    ('aliases:string[]', 'aliases'),
+]
+
+RELATIONSHIP_COLUMNS = [
+    (':START_ID(Concept)', 'source'),
+    (':END_ID(Concept)', 'target'),
+    ('type', 'type'),
+    ('confidence:float', 'confidence'),
+    ('forward_strength:float', 'forward_strength'),
+    ('backward_strength:float', 'backward_strength'),
+    ('sightings:int', 'sightings'),
+    ('first_seen', 'first_seen'),
+    ('last_seen', 'last_seen'),
+    ('category', 'category'),
+    ('directness', 'directness'),
+    ('strength', 'strength'),
+    ('source_context', 'source_context'),
+    ('extraction_method', 'extraction_method'),
+]
+
+# LOAD CSV fallback for a running database, committed every $batch_size rows.
+# Nodes and edges are merged, so it can also top up a non-empty graph.
+LOAD_CONCEPTS_QUERY = """
+LOAD CSV WITH HEADERS FROM $url AS row
+CALL {
+    WITH row
+    MERGE (c:Concept {name: row.`name:ID(Concept)`})
+    SET c.type = row.type,
+        c.description = row.description,
+        c.confidence = toFloat(row.`confidence:float`),
+        c.source_position = toInteger(row.`source_position:int`),
+        c.source_context = row.source_context,
+        c.hierarchy_parent = row.hierarchy_parent,
+        c.hierarchy_level = toInteger(row.`hierarchy_level:int`),
+        c.version = toInteger(row.`version:int`),
+        c.references = coalesce(split(row.`references:string[]`, $delimiter), []),
+        c.aliases = coalesce(split(row.`aliases:string[]`, $delimiter), [])
+} IN TRANSACTIONS OF $batch_size ROWS
+"""
+
+# Formatted with one extra assignment per free-form property column
+LOAD_RELATIONSHIPS_QUERY = """
+LOAD CSV WITH HEADERS FROM $url AS row
+CALL {{
+    WITH row
+    MATCH (source:Concept {{name: row.`:START_ID(Concept)`}})
+    MATCH (target:Concept {{name: row.`:END_ID(Concept)`}})
+    MERGE (source)-[r:RELATES_TO {{type: row.type}}]->(target)
+    SET r.confidence = toFloat(row.`confidence:float`),
+        r.forward_strength = toFloat(row.`forward_strength:float`),
+        r.backward_strength = toFloat(row.`backward_strength:float`),
+        r.sightings = toInteger(row.`sightings:int`),
+        r.first_seen = row.first_seen,
+        r.last_seen = row.last_seen,
+        r.category = row.category,
+        r.directness = row.directness,
+        r.strength = row.strength,
+        r.source_context = row.source_context,
+        r.extraction_method = row.extraction_method{extra}
+}} IN TRANSACTIONS OF $batch_size ROWS
+"""
+
+# Scores averaged over repeat sightings, as RELATIONSHIP_BATCH_QUERY does
+AVERAGED_FIELDS = ('confidence', 'forward_strength', 'backward_strength')
+
+
+class BulkExporter:
+    """Drop-in for ``Neo4jConnection`` that stages rows for a bulk import.
+
+    ``write_chunk_result`` appends each chunk's concept and relationship rows
+    as JSON lines to part files of its own under ``import_dir/parts``, so
+    corpus workers never share a file and a crash loses at most the chunk in
+    progress.  ``finalize_export`` later merges all parts into deduplicated
+    CSV files.
+    """
+
+    def __init__(self, import_dir=DEFAULT_IMPORT_DIR):
+        self.import_dir = import_dir
+        parts_dir = os.path.join(import_dir, PARTS_DIR)
+        os.makedirs(parts_dir, exist_ok=True)
+        part = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._concepts = open(os.path.join(parts_dir, f"concepts-{part}.jsonl"), 'a', encoding='utf-8')
+        self._relationships = open(os.path.join(parts_dir, f"relationships-{part}.jsonl"), 'a',
+                                   encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def write_chunk_result(self, concepts, relationships, batch_size=None, source=None):
+        """Append a chunk's rows to this exporter's part files
+
+        ``source`` is accepted for interface parity only: a bulk export is
+        always a full build and carries no provenance.
+        """
+        concepts = [json.dumps(concept.to_row()) + '\n' for concept in concepts]
+        relationships = [json.dumps(rel.to_row()) + '\n' for rel in relationships]
+        with metrics.time('bulk_write'), self._lock:
+            self._concepts.writelines(concepts)
+            self._relationships.writelines(relationships)
+            # The manifest marks the chunk done right after this returns
+            self._concepts.flush()
+            self._relationships.flush()
+        metrics.inc('bulk_rows_staged', len(concepts) + len(relationships))
+
+    def write_chunk_results(self, results, batch_size=None):
+        """Append several chunks' ``(concepts, relationships, source)`` rows"""
+        for concepts, relationships, source in results:
+            self.write_chunk_result(concepts, relationships, batch_size, source)
+
+    def fetch_concept_names(self):
+        """Nothing to warm from; names are resolved within the export"""
+        return []
+
+    def close(self):
+        with self._lock:
+            self._concepts.close()
+            self._relationships.close()
+
+
+def clear_parts(import_dir=DEFAULT_IMPORT_DIR):
+    """Remove part files left by an earlier export"""
+    for path in glob.glob(os.path.join(import_dir, PARTS_DIR, '*.jsonl')):
+        os.remove(path)
+
+
+def _read_parts(import_dir, prefix):
+    for path in sorted(glob.glob(os.path.join(import_dir, PARTS_DIR, f"{prefix}-*.jsonl"))):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                # A worker killed mid-write can leave a torn last line
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    metrics.inc('bulk_rows_torn')
+
+
+def merge_concepts(rows):
+    """Deduplicate concept rows by name; later rows win, aliases accumulate"""
+    merged = {}
+    for row in rows:
+        previous = merged.get(row['name'])
+        aliases = list(previous['aliases']) if previous is not None else []
+        aliases += [alias for alias in row.get('aliases') or [] if alias not in aliases]
+        merged[row['name']] = dict(row, aliases=aliases)
+    return merged
+
+
+def merge_relationships(rows):
+    """Deduplicate relationship rows on (source, type, target)
+
+    Scores become running means over ``sightings`` and the first_seen /
+    last_seen window is widened, matching the transactional writes.
+    """
+    merged = {}
+    for row in rows:
+        key = (row['source'], row['type'], row['target'])
+        edge = merged.get(key)
+        if edge is None:
+            edge = dict(row, sightings=0, properties={})
+            merged[key] = edge
+        n = edge['sightings']
+        for name in AVERAGED_FIELDS:
+            value = row.get(name)
+            if value is not None:
+                edge[name] = ((edge.get(name) or 0.0) * n + value) / (n + 1)
+        if row.get('first_seen') and (not edge.get('first_seen') or row['first_seen'] < edge['first_seen']):
+            edge['first_seen'] = row['first_seen']
+        if row.get('last_seen') and (not edge.get('last_seen') or row['last_seen'] > edge['last_seen']):
+            edge['last_seen'] = row['last_seen']
+        for name in ('category', 'directness', 'strength', 'source_context', 'extraction_method'):
+            edge[name] = row.get(name)
+        edge['properties'].update(row.get('properties') or {})
+        edge['sightings'] = n + 1
+    return merged
+
+
+def _cell(value):
+    if isinstance(value, list):
+        return ARRAY_DELIMITER.join(str(item).replace(ARRAY_DELIMITER, ' ') for item in value)
+    return value
+
+
+def finalize_export(import_dir=DEFAULT_IMPORT_DIR):
+    """Merge all part files into ``concepts.csv`` and ``relationships.csv``
+
+    Relationships whose endpoints were never extracted as concepts are
+    dropped, as the transactional MATCH would drop them.  Free-form
+    relationship properties become extra string columns.  Returns
+    ``(concept_count, relationship_count)``.
+    """
+    with metrics.time('bulk_finalize'):
+        concepts = merge_concepts(_read_parts(import_dir, 'concepts'))
+        relationships = merge_relationships(_read_parts(import_dir, 'relationships'))
+
+        fixed = {header.split(':')[0] for header, _ in RELATIONSHIP_COLUMNS}
+        extra = sorted({
+            key for edge in relationships.values() for key in edge['properties']
+            if key not in fixed
+        })
+
+        with open(os.path.join(import_dir, CONCEPTS_FILE), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow([header for header, _ in CONCEPT_COLUMNS])
+            for row in concepts.values():
+                writer.writerow([_cell(row.get(field)) for _, field in CONCEPT_COLUMNS])
+
+        written = 0
+        with open(os.path.join(import_dir, RELATIONSHIPS_FILE), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow([header for header, _ in RELATIONSHIP_COLUMNS] + extra)
+            for edge in relationships.values():
+                if edge['source'] not in concepts or edge['target'] not in concepts:
+                    metrics.inc('bulk_relationships_dropped')
+                    continue
+                writer.writerow(
+                    [_cell(edge.get(field)) for _, field in RELATIONSHIP_COLUMNS]
+                    + [edge['properties'].get(key) for key in extra]
+                )
+                written += 1
+    return len(concepts), written
+
+
+def _escape_name(name):
+    return name.replace('`', '``')
+
+
+def load_csv(connection, import_dir=DEFAULT_IMPORT_DIR, batch_size=10000):
+    """Load the exported CSVs into a running database with LOAD CSV
+
+    Runs as auto-commit queries so ``CALL ... IN TRANSACTIONS`` can commit
+    every ``batch_size`` rows.  The files must sit in the server's import
+    directory.  Returns the number of nodes and relationships created.
+    """
+    with open(os.path.join(import_dir, RELATIONSHIPS_FILE), newline='', encoding='utf-8') as f:
+        header = next(csv.reader(f), [])
+    extra = header[len(RELATIONSHIP_COLUMNS):]
+    relationships_query = LOAD_RELATIONSHIPS_QUERY.format(extra=''.join(
+        f",\n        r.`{_escape_name(key)}` = row.`{_escape_name(key)}`" for key in extra
+    ))
+
+    created = {}
+
+    def load(query, file_name, counter):
+        def operation(session):
+            summary = session.run(
+                query,
+                url=f"file:///{file_name}",
+                delimiter=ARRAY_DELIMITER,
+                batch_size=batch_size
+            ).consume()
+            return getattr(summary.counters, counter)
+        with metrics.time('bulk_load'):
+            created[file_name] = connection.execute_with_retry(operation)
+
+    load(LOAD_CONCEPTS_QUERY, CONCEPTS_FILE, 'nodes_created')
+    load(relationships_query, RELATIONSHIPS_FILE, 'relationships_created')
+    return created[CONCEPTS_FILE], created[RELATIONSHIPS_FILE]
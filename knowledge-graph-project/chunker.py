@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+import hashlib
+import mmap
+import os
+import re
+from dataclasses import dataclass
+
+HEADING_PATTERN = re.compile(rb'^#{1,6}\s')
+FENCE_PATTERN = re.compile(rb'^\s*(```|~~~)')
+MARKDOWN_EXTENSIONS = {'.md', '.markdown', '.mdown', '.mkd'}
+
+# Rough characters-per-token ratio for English technical prose
+CHARS_PER_TOKEN = 4
+
+# In anchored mode a chunk is not cut at a heading or content breakpoint
+# until it holds this fraction of the budget
+ANCHOR_MIN_FILL = 0.5
+
+
+def estimate_tokens(text):
+    """Cheap token estimate used for chunk budgeting"""
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+@dataclass
+class Chunk:
+    """A piece of a document with its absolute position in the file.
+
+    ``start``/``end`` are byte offsets and ``start_char``/``end_char`` are
+    character offsets of ``text`` within the whole document.  When overlap is
+    enabled ``text`` begins with the tail of the previous chunk, and
+    ``body_start``/``body_start_char`` mark where the new content begins.
+    ``source_id`` is set in incremental mode to the provenance key recorded
+    on everything written from the chunk.
+    """
+    text: str
+    start: int
+    end: int
+    start_char: int
+    end_char: int
+    body_start: int
+    body_start_char: int
+    source_id: str = None
+
+    @property
+    def tokens(self):
+        return estimate_tokens(self.text)
+
+
+@dataclass
+class _Block:
+    text: str
+    start: int
+    end: int
+    start_char: int
+    end_char: int
+    heading: bool
+
+
+def _is_breakpoint(block, max_tokens):
+    """Whether a chunk may end after ``block``, decided from its text alone
+
+    A block is a breakpoint with probability proportional to its size, so
+    breakpoints fall about every half budget on average wherever they are.
+    """
+    digest = hashlib.blake2b(block.text.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % max_tokens < 2 * estimate_tokens(block.text)
+
+
+def _iter_lines(buffer, start):
+    """Yield (line_bytes, start, end) from ``buffer`` beginning at ``start``"""
+    size = len(buffer)
+    position = start
+    while position < size:
+        newline = buffer.find(b'\n', position)
+        end = size if newline == -1 else newline + 1
+        yield buffer[position:end], position, end
+        position = end
+
+
+def _iter_blocks(buffer, start, start_char, markdown):
+    """Group lines into paragraph, heading and fenced-code blocks"""
+    lines = []
+    block_start = block_start_char = None
+    char_position = start_char
+    heading = False
+    in_fence = False
+
+    def flush():
+        text = ''.join(text for text, _ in lines)
+        return _Block(text, block_start, lines[-1][1], block_start_char, char_position, heading)
+
+    for raw, line_start, line_end in _iter_lines(buffer, start):
+        text = raw.decode('utf-8', errors='replace')
+        is_blank = not raw.strip()
+        is_fence = markdown and FENCE_PATTERN.match(raw) is not None
+        is_heading = markdown and not in_fence and HEADING_PATTERN.match(raw) is not None
+
+        # A heading always opens a new block; a blank line closes a paragraph
+        if lines and not in_fence and (is_heading or is_blank):
+            yield flush()
+            lines = []
+        if not lines:
+            block_start, block_start_char = line_start, char_position
+            heading = is_heading
+
+        lines.append((text, line_end))
+        char_position += len(text)
+        if is_fence:
+            in_fence = not in_fence
+
+    if lines:
+        yield flush()
+
+
+def _split_block(block, max_chars):
+    """Split a block larger than the budget on line, then character, boundaries"""
+    pieces = []
+    char_position = block.start_char
+    byte_position = block.start
+    current = ''
+
+    def emit(text):
+        nonlocal char_position, byte_position
+        size = len(text.encode('utf-8', errors='replace'))
+        pieces.append(_Block(text, byte_position, byte_position + size,
+                             char_position, char_position + len(text), False))
+        char_position += len(text)
+        byte_position += size
+
+    for line in block.text.splitlines(keepends=True):
+        while len(line) > max_chars:
+            if current:
+                emit(current)
+                current = ''
+            cut = line.rfind(' ', 0, max_chars)
+            cut = cut + 1 if cut > 0 else max_chars
+            emit(line[:cut])
+            line = line[cut:]
+        if len(current) + len(line) > max_chars and current:
+            emit(current)
+            current = ''
+        current += line
+    if current:
+        emit(current)
+
+    if pieces:
+        # Snap the last piece to the block's true end in case decoding was lossy
+        pieces[-1].end = block.end
+    return pieces
+
+
+def iter_chunks(file_path, max_tokens=1000, overlap_tokens=0, start=0, start_char=0,
+                markdown=None, anchored=False):
+    """Split a document into token-budgeted chunks with absolute offsets.
+
+    Markdown headings and blank-line-separated paragraphs are never split
+    unless a single block exceeds the budget.  A heading starts a new chunk
+    once the current chunk is at least half full, so sections stay together
+    without producing tiny prompts.  Overlap is taken from whole trailing
+    blocks and comes on top of the budget.  The file is memory-mapped, so
+    very large inputs are scanned without being read into memory.  ``start``
+    and ``start_char`` resume scanning from a previous chunk's ``end``.
+
+    With ``anchored=True`` chunks end at content-defined breakpoints instead
+    of wherever the budget runs out: every heading, and every block whose
+    content hash marks it as a breakpoint, ends a chunk that is at least
+    half full.  Boundaries after an edit realign within a breakpoint or two,
+    so the chunks beyond it come out byte-identical, which is what
+    incremental re-ingestion relies on.
+    """
+    if markdown is None:
+        markdown = os.path.splitext(file_path)[1].lower() in MARKDOWN_EXTENSIONS
+    max_chars = max_tokens * CHARS_PER_TOKEN
+
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size <= start:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            current = []
+            current_tokens = 0
+            carried = 0  # number of leading blocks in ``current`` that are overlap
+
+            def make_chunk():
+                body = current[carried] if carried < len(current) else current[-1]
+                return Chunk(
+                    text=''.join(block.text for block in current),
+                    start=current[0].start,
+                    end=current[-1].end,
+                    start_char=current[0].start_char,
+                    end_char=current[-1].end_char,
+                    body_start=body.start,
+                    body_start_char=body.start_char
+                )
+
+            def overlap_tail():
+                tail = []
+                tokens = 0
+                for block in reversed(current):
+                    block_tokens = estimate_tokens(block.text)
+                    if tokens + block_tokens > overlap_tokens:
+                        break
+                    tail.insert(0, block)
+                    tokens += block_tokens
+                return tail, tokens
+
+            for block in _iter_blocks(buffer, start, start_char, markdown):
+                pieces = [block] if len(block.text) <= max_chars else _split_block(block, max_chars)
+                for piece in pieces:
+                    piece_tokens = estimate_tokens(piece.text)
+                    has_body = len(current) > carried
+                    over_budget = current_tokens + piece_tokens > max_tokens
+                    if anchored:
+                        section_break = (
+                            current_tokens >= max_tokens * ANCHOR_MIN_FILL and piece.text.strip()
+                            and (piece.heading or _is_breakpoint(current[-1], max_tokens))
+                        )
+                    else:
+                        section_break = piece.heading and current_tokens >= max_tokens // 2
+                    if has_body and (over_budget or section_break):
+                        yield make_chunk()
+                        if overlap_tokens:
+                            current, current_tokens = overlap_tail()
+                        else:
+                            current, current_tokens = [], 0
+                        carried = len(current)
+                    current.append(piece)
+                    current_tokens += piece_tokens
+
+            if len(current) > carried:
+                yield make_chunk()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+import heapq
+import threading
+from collections import OrderedDict
+
+from chunker import estimate_tokens
+
+# Only concepts at least this confident are remembered
+MIN_CONFIDENCE = 0.7
+
+# Score multiplier per chunk since a concept was last seen
+RECENCY_DECAY = 0.9
+
+# Shorter names are not matched against chunk text; they would match everywhere
+MIN_MENTION_LENGTH = 3
+
+
+class ContextStore:
+    """Rolling prompt context indexed by concept name.
+
+    Concepts are deduplicated by case-insensitive name and scored by
+    confidence decayed by how many chunks ago they were last seen.  For
+    each chunk the store renders, within ``token_budget`` tokens:
+
+    1. remembered concepts mentioned in the chunk, best first
+    2. their neighbors in the graph, as ``source -[type]-> target`` lines
+    3. the best-scoring remaining concepts, picked with a heap
+
+    Neighbors come from one batched Neo4j read for the mentioned names that
+    are not already in an LRU cache; relationships extracted during the run
+    are added to cached entries as they arrive, so most chunks need no
+    round trip.  At most ``max_entries`` concepts are kept.
+    """
+
+    def __init__(self, entries=None, token_budget=300, max_entries=100, neo4j=None,
+                 neighbor_limit=5, cache_size=1024):
+        self.token_budget = token_budget
+        self.max_entries = max_entries
+        self.neo4j = neo4j
+        self.neighbor_limit = neighbor_limit
+        self.cache_size = cache_size
+        self._entries = {}
+        self._neighbors = OrderedDict()
+        self._clock = 0
+        self._lock = threading.RLock()
+        for entry in entries or []:
+            self._entries[entry['name'].lower()] = dict(entry, seen=entry.get('seen', 0))
+            self._clock = max(self._clock, entry.get('seen', 0))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _score(self, entry):
+        return entry['confidence'] * RECENCY_DECAY ** (self._clock - entry['seen'])
+
+    def add(self, concepts):
+        """Remember the confident concepts of one chunk (or one streamed concept)"""
+        with self._lock:
+            self._clock += 1
+            for concept in concepts:
+                if concept.confidence < MIN_CONFIDENCE or not concept.name:
+                    continue
+                key = concept.name.lower()
+                previous = self._entries.get(key)
+                self._entries[key] = {
+                    'name': concept.name,
+                    'type': concept.type,
+                    'description': concept.description,
+                    'hierarchy': {
+                        'parent': concept.hierarchy_parent,
+                        'level': concept.hierarchy_level
+                    },
+                    'confidence': max(concept.confidence, previous['confidence'] if previous else 0.0),
+                    'seen': self._clock
+                }
+            overflow = len(self._entries) - self.max_entries
+            if overflow > 0:
+                for key, _ in heapq.nsmallest(overflow, self._entries.items(),
+                                              key=lambda item: self._score(item[1])):
+                    del self._entries[key]
+
+    def observe_relationships(self, relationships):
+        """Add freshly extracted relationships to cached neighbor lists"""
+        with self._lock:
+            for rel in relationships:
+                for name, other, outgoing in ((rel.source, rel.target, True),
+                                              (rel.target, rel.source, False)):
+                    cached = self._neighbors.get((name or '').lower())
+                    if cached is None or len(cached) >= self.neighbor_limit:
+                        continue
+                    if not any(n['name'] == other and n['type'] == rel.type for n in cached):
+                        cached.append({'name': other, 'type': rel.type, 'outgoing': outgoing})
+
+    def _fetch_neighbors(self, names):
+        """Neighbor lists for ``names``, reading only cache misses from Neo4j"""
+        found = {}
+        missing = []
+        for name in names:
+            key = name.lower()
+            if key in self._neighbors:
+                self._neighbors.move_to_end(key)
+                found[key] = self._neighbors[key]
+            else:
+                missing.append(name)
+        if missing and self.neo4j is not None:
+            fetched = self.neo4j.fetch_neighbors(missing, self.neighbor_limit)
+            for name in missing:
+                key = name.lower()
+                # Cache empty results too, so unknown names are not re-queried
+                found[key] = self._neighbors[key] = list(fetched.get(name, []))
+            while len(self._neighbors) > self.cache_size:
+                self._neighbors.popitem(last=False)
+        return found
+
+    @staticmethod
+    def _entry_lines(entry):
+        lines = [f"{entry['name']} ({entry['type']}): {entry['description']}"]
+        if (entry.get('hierarchy') or {}).get('parent'):
+            lines.append(f"Parent: {entry['hierarchy']['parent']}")
+        return lines
+
+    def _candidates(self, chunk_text):
+        """Yield blocks of context lines in priority order"""
+        lowered = chunk_text.lower()
+        mentioned = [entry for key, entry in self._entries.items()
+                     if len(key) >= MIN_MENTION_LENGTH and key in lowered]
+        mentioned.sort(key=self._score, reverse=True)
+        for entry in mentioned:
+            yield self._entry_lines(entry)
+
+        if mentioned:
+            try:
+                neighbors = self._fetch_neighbors([entry['name'] for entry in mentioned])
+            except Exception:
+                # Graph context is an optimization; never fail a chunk over it
+                neighbors = {}
+            for entry in mentioned:
+                for neighbor in neighbors.get(entry['name'].lower(), []):
+                    if neighbor['outgoing']:
+                        yield [f"{entry['name']} -[{neighbor['type']}]-> {neighbor['name']}"]
+                    else:
+                        yield [f"{neighbor['name']} -[{neighbor['type']}]-> {entry['name']}"]
+
+        # Pop the rest best-first only until the budget runs out
+        mentioned_keys = {entry['name'].lower() for entry in mentioned}
+        heap = [(-self._score(entry), key, entry) for key, entry in self._entries.items()
+                if key not in mentioned_keys]
+        heapq.heapify(heap)
+        while heap:
+            yield self._entry_lines(heapq.heappop(heap)[2])
+
+    def render(self, chunk_text):
+        """Context for a prompt about ``chunk_text``, within the token budget"""
+        with self._lock:
+            lines = []
+            used = 0
+            for block in self._candidates(chunk_text):
+                cost = sum(estimate_tokens(line) for line in block)
+                if used + cost > self.token_budget:
+                    # A smaller, lower-ranked block may still fit
+                    continue
+                lines.extend(block)
+                used += cost
+                if used >= self.token_budget:
+                    break
+            return '\n'.join(lines)
+
+    def to_list(self):
+        """Entries in a JSON-friendly form for the run manifest, best first"""
+        with self._lock:
+            return [dict(entry) for entry in
+                    sorted(self._entries.values(), key=self._score, reverse=True)]
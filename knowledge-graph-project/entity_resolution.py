@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+from metrics import metrics
+
+# Minimum trigram Jaccard similarity for a fuzzy match
+DEFAULT_THRESHOLD = 0.8
+
+# Normalized keys shorter than this only ever match exactly
+MIN_FUZZY_LENGTH = 5
+
+# Candidates scored per fuzzy lookup, taken by number of shared trigrams
+MAX_CANDIDATES = 20
+
+# Leading articles are dropped from the match key.  Trailing generic head
+# nouns are only dropped when what remains is already known, so "the Neo4j
+# database" resolves to an existing "Neo4j" but "File System" never becomes
+# "File"
+ARTICLES = {'a', 'an', 'the'}
+GENERIC_SUFFIXES = {'database', 'db', 'system', 'service', 'tool', 'platform', 'framework',
+                    'library', 'feature', 'component', 'module'}
+
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+
+def singular(token):
+    """Crude plural folding for the match key: 'items' becomes 'item'"""
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def normalize(name):
+    """Match key for a concept name: case-folded, punctuation-free, without articles"""
+    text = unicodedata.normalize('NFKC', name or '').casefold()
+    tokens = TOKEN_PATTERN.findall(text)
+    while len(tokens) > 1 and tokens[0] in ARTICLES:
+        tokens.pop(0)
+    return ' '.join(singular(token) for token in tokens)
+
+
+def head_keys(key):
+    """Shorter keys left by dropping trailing generic nouns, longest first"""
+    tokens = key.split(' ')
+    while len(tokens) > 1 and tokens[-1] in GENERIC_SUFFIXES:
+        tokens.pop()
+        yield ' '.join(tokens)
+
+
+def trigrams(key):
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class EntityResolver:
+    """Maps concept name spellings onto one canonical name per concept.
+
+    A name resolves, in order, through its normalized key, then through that
+    key without trailing generic nouns if the shorter key is already known,
+    then through a trigram index of known keys (Jaccard similarity of at
+    least ``threshold``), and otherwise becomes a new canonical name.  Every
+    spelling that resolved to a different canonical name is remembered as an
+    alias and sent with the concept, so the graph accumulates the alias
+    table in ``c.aliases``.  ``warm`` loads names and aliases from Neo4j.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self._canonical = {}
+        self._postings = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._canonical)
+
+    def _register(self, key, canonical):
+        self._canonical[key] = canonical
+        for gram in trigrams(key):
+            self._postings[gram].add(key)
+
+    def _fuzzy(self, key):
+        grams = trigrams(key)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        best_key, best_score = None, self.threshold
+        for candidate, count in shared.most_common(MAX_CANDIDATES):
+            if len(candidate) < MIN_FUZZY_LENGTH:
+                continue
+            score = count / (len(grams) + len(trigrams(candidate)) - count)
+            if score >= best_score:
+                best_key, best_score = candidate, score
+        return best_key
+
+    def add_known(self, name, aliases=()):
+        """Register a canonical name, e.g. an existing node, with its aliases"""
+        with self._lock:
+            for spelling in (name, *aliases):
+                key = normalize(spelling)
+                if key and key not in self._canonical:
+                    self._register(key, name)
+
+    def resolve(self, name, register=True):
+        """Canonical name for ``name``; unknown names become canonical if ``register``"""
+        key = normalize(name)
+        if not key:
+            return name
+        with self._lock:
+            canonical = self._canonical.get(key)
+            if canonical is None:
+                for head in head_keys(key):
+                    canonical = self._canonical.get(head)
+                    if canonical is not None:
+                        self._register(key, canonical)
+                        break
+            if canonical is None and len(key) >= MIN_FUZZY_LENGTH:
+                match = self._fuzzy(key)
+                if match is not None:
+                    canonical = self._canonical[match]
+                    self._register(key, canonical)
+                    metrics.inc('entity_fuzzy_matches')
+            if canonical is None:
+                if register:
+                    self._register(key, name)
+                return name
+        if canonical != name:
+            metrics.inc('entities_resolved')
+        return canonical
+
+    def resolve_concept(self, concept):
+        """Rename a ``Concept`` in place, recording its spelling as an alias"""
+        canonical = self.resolve(concept.name)
+        if canonical != concept.name:
+            if concept.name not in concept.aliases:
+                concept.aliases.append(concept.name)
+            concept.name = canonical
+        if concept.hierarchy_parent:
+            concept.hierarchy_parent = self.resolve(concept.hierarchy_parent, register=False)
+        concept.references = [self.resolve(ref, register=False) for ref in concept.references]
+        return concept
+
+    def resolve_relationship(self, rel):
+        """Point a ``Relationship`` at the canonical names of its endpoints"""
+        rel.source = self.resolve(rel.source)
+        rel.target = self.resolve(rel.target)
+        return rel
+
+    def resolve_analysis(self, analysis):
+        """Resolve every record of an ``Analysis``; concepts first so endpoints match"""
+        for concept in analysis.concepts:
+            self.resolve_concept(concept)
+        for rel in analysis.relationships:
+            self.resolve_relationship(rel)
+        return analysis
+
+    def warm(self, neo4j):
+        """Load every concept name and alias already in the graph"""
+        count = 0
+        for name, aliases in neo4j.fetch_concept_names():
+            self.add_known(name, aliases or ())
+            count += 1
+        return count
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+import logging
+import time
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # optional: only needed for the analytics pass
+    np = None
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+NODES_QUERY = "MATCH (c:Concept) RETURN c.name AS name"
+
+EDGES_QUERY = """
+MATCH (source:Concept)-[r:RELATES_TO]->(target:Concept)
+RETURN source.name AS source, target.name AS target,
+       coalesce(r.confidence, 1.0) AS confidence,
+       coalesce(r.forward_strength, 1.0) AS forward,
+       coalesce(r.backward_strength, r.forward_strength, 1.0) AS backward
+"""
+
+WRITE_BACK_QUERY = """
+UNWIND $rows AS row
+MATCH (c:Concept {name: row.name})
+SET c.pagerank = row.pagerank,
+    c.component = row.component,
+    c.component_size = row.component_size,
+    c.community = row.community,
+    c.community_size = row.community_size
+"""
+
+
+class Graph:
+    """Weighted directed graph in CSR form over node indices ``0..n-1``
+
+    ``indptr``/``indices``/``weights`` hold each node's outgoing edges.
+    Edge weights are ``confidence * forward_strength``; the reverse
+    direction, used by the undirected algorithms, is weighted by
+    ``confidence * backward_strength``.
+    """
+
+    def __init__(self, names, sources, targets, forward, backward):
+        self.names = names
+        self.n = len(names)
+        order = np.argsort(sources, kind='stable')
+        self.sources = sources[order]
+        self.indices = targets[order]
+        self.weights = forward[order]
+        self.backward = backward[order]
+        self.indptr = np.zeros(self.n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.sources, minlength=self.n), out=self.indptr[1:])
+
+    def undirected(self):
+        """Both directions of every edge as ``(nodes, neighbors, weights)``"""
+        return (
+            np.concatenate([self.sources, self.indices]),
+            np.concatenate([self.indices, self.sources]),
+            np.concatenate([self.weights, self.backward])
+        )
+
+
+def load_graph(neo4j):
+    """Stream nodes and edges out of Neo4j into a ``Graph``
+
+    Records are consumed as they arrive and packed into typed arrays, so
+    the Python-side footprint stays near the size of the final arrays.
+    """
+    def read_nodes(session):
+        return [record['name'] for record in session.run(NODES_QUERY)]
+
+    def read_edges(session):
+        columns = (array('q'), array('q'), array('f'), array('f'))
+        for record in session.run(EDGES_QUERY):
+            source = index.get(record['source'])
+            target = index.get(record['target'])
+            if source is None or target is None:
+                continue
+            confidence = record['confidence']
+            columns[0].append(source)
+            columns[1].append(target)
+            columns[2].append(confidence * record['forward'])
+            columns[3].append(confidence * record['backward'])
+        return columns
+
+    with metrics.time('analytics_load'):
+        names = neo4j.execute_with_retry(read_nodes)
+        index = {name: position for position, name in enumerate(names)}
+        sources, targets, forward, backward = neo4j.execute_with_retry(read_edges)
+        graph = Graph(
+            names,
+            np.frombuffer(sources, dtype=np.int64),
+            np.frombuffer(targets, dtype=np.int64),
+            np.frombuffer(forward, dtype=np.float32).astype(np.float64),
+            np.frombuffer(backward, dtype=np.float32).astype(np.float64)
+        )
+    logger.info(f"Loaded {graph.n} concepts and {len(graph.indices)} relationships")
+    return graph
+
+
+def pagerank(graph, damping=0.85, tolerance=1e-6, max_iterations=100):
+    """Weighted PageRank by power iteration; dangling mass is spread evenly"""
+    n = graph.n
+    if n == 0:
+        return np.zeros(0)
+    out_weight = np.bincount(graph.sources, weights=graph.weights, minlength=n)
+    dangling = out_weight == 0
+    share = np.divide(graph.weights, out_weight[graph.sources],
+                      out=np.zeros_like(graph.weights), where=out_weight[graph.sources] > 0)
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iterations):
+        incoming = np.bincount(graph.indices, weights=rank[graph.sources] * share, minlength=n)
+        updated = (1 - damping) / n + damping * (incoming + rank[dangling].sum() / n)
+        delta = np.abs(updated - rank).sum()
+        rank = updated
+        if delta < tolerance:
+            break
+    return rank
+
+
+def weakly_connected_components(graph):
+    """Component label per node: the smallest node index in its component
+
+    Min-label propagation over both edge directions, with pointer jumping so
+    long chains collapse in a logarithmic number of rounds.
+    """
+    labels = np.arange(graph.n)
+    nodes, neighbors, _ = graph.undirected()
+    if len(nodes) == 0:
+        return labels
+    while True:
+        previous = labels.copy()
+        np.minimum.at(labels, nodes, labels[neighbors])
+        # Pointer jumping: follow labels to their own labels until stable
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def label_propagation(graph, max_iterations=20, seed=0):
+    """Weighted label-propagation communities
+
+    Each round every node adopts the label with the largest total incident
+    edge weight among its neighbours (ties go to the smaller label), keeping
+    its own label when it has no neighbours.  Half the nodes update per
+    round, chosen at random, which stops the synchronous version from
+    oscillating on bipartite structures.
+    """
+    n = graph.n
+    labels = np.arange(n)
+    nodes, neighbors, weights = graph.undirected()
+    if len(nodes) == 0:
+        return labels
+    rng = np.random.default_rng(seed)
+    for _ in range(max_iterations):
+        # Total weight per (node, candidate label) pair, sorted by node then label
+        keys = nodes * n + labels[neighbors]
+        order = np.argsort(keys)
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        totals = np.add.reduceat(weights[order], starts)
+        pair_nodes, pair_labels = np.divmod(keys[starts], n)
+        # Best pair per node: largest total, then smallest label
+        node_starts = np.flatnonzero(np.r_[True, pair_nodes[1:] != pair_nodes[:-1]])
+        node_best = np.maximum.reduceat(totals, node_starts)
+        group = np.cumsum(np.r_[False, pair_nodes[1:] != pair_nodes[:-1]])
+        candidates = np.flatnonzero(totals == node_best[group])
+        winners = candidates[np.r_[True, pair_nodes[candidates][1:] != pair_nodes[candidates][:-1]]]
+        proposed = labels.copy()
+        proposed[pair_nodes[winners]] = pair_labels[winners]
+        update = rng.random(n) < 0.5
+        changed = update & (proposed != labels)
+        if not changed.any() and np.array_equal(proposed, labels):
+            break
+        labels = np.where(update, proposed, labels)
+    return labels
+
+
+def write_back(neo4j, graph, ranks, components, communities, batch_size=10000):
+    """Store the results on the Concept nodes, one transaction per batch"""
+    component_sizes = np.bincount(components, minlength=graph.n)
+    community_sizes = np.bincount(communities, minlength=graph.n)
+
+    def work(tx, rows):
+        tx.run(WRITE_BACK_QUERY, rows=rows).consume()
+
+    with metrics.time('analytics_write'):
+        for start in range(0, graph.n, batch_size):
+            stop = min(graph.n, start + batch_size)
+            rows = [
+                {
+                    'name': graph.names[node],
+                    'pagerank': float(ranks[node]),
+                    'component': int(components[node]),
+                    'component_size': int(component_sizes[components[node]]),
+                    'community': int(communities[node]),
+                    'community_size': int(community_sizes[communities[node]])
+                }
+                for node in range(start, stop)
+            ]
+            neo4j.write(work, rows)
+    neo4j.write_generation += 1
+
+
+def run_analytics(neo4j, damping=0.85, iterations=100, batch_size=10000):
+    """Compute PageRank, components and communities and store them on Concept nodes
+
+    The RELATES_TO edge list is read once and every metric is computed in
+    memory, so the pass needs neither the GDS plugin nor per-node queries.
+    Returns a summary of the run.
+    """
+    if np is None:
+        raise RuntimeError("Graph analytics need NumPy: pip install numpy")
+    started = time.perf_counter()
+    graph = load_graph(neo4j)
+    with metrics.time('analytics_compute'):
+        ranks = pagerank(graph, damping=damping, max_iterations=iterations)
+        components = weakly_connected_components(graph)
+        communities = label_propagation(graph)
+    write_back(neo4j, graph, ranks, components, communities, batch_size)
+    return {
+        'concepts': graph.n,
+        'relationships': int(len(graph.indices)),
+        'components': int(len(np.unique(components))),
+        'communities': int(len(np.unique(communities))),
+        'seconds': round(time.perf_counter() - started, 1)
+    }
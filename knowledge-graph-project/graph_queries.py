@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import metrics
+
+# Variable-length bounds can't be query parameters, so they are formatted in
+# and capped to keep a traversal from walking the whole graph
+MAX_DEPTH = 10
+MAX_HOPS = 4
+
+SUBTREE_QUERY = """
+MATCH path = (descendant:Concept)-[:CHILD_OF*1..{depth}]->(:Concept {{name: $name}})
+WITH descendant, min(length(path)) AS depth
+RETURN descendant.name AS name, depth
+ORDER BY depth, name
+LIMIT $limit
+"""
+
+ANCESTORS_QUERY = """
+MATCH path = (:Concept {{name: $name}})-[:CHILD_OF*1..{depth}]->(ancestor:Concept)
+WITH ancestor, min(length(path)) AS depth
+RETURN ancestor.name AS name, depth
+ORDER BY depth
+"""
+
+NEIGHBORS_QUERY = """
+MATCH path = (start:Concept {{name: $name}})-[:RELATES_TO*1..{hops}]-(other:Concept)
+WHERE other <> start
+WITH other, min(length(path)) AS hops
+RETURN other.name AS name, hops
+ORDER BY hops, name
+LIMIT $limit
+"""
+
+SHORTEST_PATH_QUERY = """
+MATCH (source:Concept {{name: $source}}), (target:Concept {{name: $target}})
+MATCH path = shortestPath((source)-[:RELATES_TO|CHILD_OF*..{hops}]-(target))
+RETURN [node IN nodes(path) | node.name] AS names,
+       [rel IN relationships(path) | coalesce(rel.type, type(rel))] AS types
+"""
+
+
+class GraphQueries:
+    """Prepared read-side traversals over the concept graph, behind a cache.
+
+    Results are kept in an LRU cache of ``cache_size`` entries, each valid
+    for ``ttl`` seconds.  Entries are also dropped once the connection's
+    ``write_generation`` moves on, so anything written through the same
+    ``Neo4jConnection`` is visible at once; writes from other processes show
+    up after at most ``ttl`` seconds.
+    """
+
+    def __init__(self, neo4j, cache_size=1024, ttl=60.0):
+        self.neo4j = neo4j
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self._cache = OrderedDict()
+        self._generation = neo4j.write_generation
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _read(self, key, query, **parameters):
+        now = time.monotonic()
+        with self._lock:
+            if self._generation != self.neo4j.write_generation:
+                self._cache.clear()
+                self._generation = self.neo4j.write_generation
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > now:
+                self._cache.move_to_end(key)
+                metrics.inc('graph_query_cache_hits')
+                return cached[1]
+            generation = self._generation
+
+        def work(tx):
+            return tx.run(query, **parameters).data()
+
+        with metrics.time('graph_query'):
+            rows = self.neo4j.read(work)
+
+        with self._lock:
+            # Don't cache a result that may predate a write made meanwhile
+            if generation == self.neo4j.write_generation:
+                self._cache[key] = (now + self.ttl, rows)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return rows
+
+    def subtree(self, name, max_depth=MAX_DEPTH, limit=1000):
+        """``[{name, depth}, ...]`` of the concepts below ``name`` via CHILD_OF"""
+        depth = max(1, min(max_depth, MAX_DEPTH))
+        return self._read(
+            ('subtree', name, depth, limit),
+            SUBTREE_QUERY.format(depth=depth), name=name, limit=limit
+        )
+
+    def ancestors(self, name, max_depth=MAX_DEPTH):
+        """``[{name, depth}, ...]`` from the parent of ``name`` up to the root"""
+        depth = max(1, min(max_depth, MAX_DEPTH))
+        return self._read(
+            ('ancestors', name, depth),
+            ANCESTORS_QUERY.format(depth=depth), name=name
+        )
+
+    def neighbors(self, name, hops=1, limit=100):
+        """``[{name, hops}, ...]`` of concepts within ``hops`` RELATES_TO edges"""
+        hops = max(1, min(hops, MAX_HOPS))
+        return self._read(
+            ('neighbors', name, hops, limit),
+            NEIGHBORS_QUERY.format(hops=hops), name=name, limit=limit
+        )
+
+    def shortest_path(self, source, target, max_hops=MAX_DEPTH):
+        """``{names, types}`` along a shortest path between two concepts, or None"""
+        hops = max(1, min(max_hops, MAX_DEPTH))
+        rows = self._read(
+            ('shortest_path', source, target, hops),
+            SHORTEST_PATH_QUERY.format(hops=hops), source=source, target=target
+        )
+        return rows[0] if rows else None
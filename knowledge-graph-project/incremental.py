@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+import hashlib
+import os
+
+from metrics import metrics
+
+
+def document_id(document_path):
+    """Stable identifier of a document, recorded as its chunks' provenance"""
+    return os.path.abspath(document_path)
+
+
+def chunk_hash(chunk):
+    """Content hash of a chunk's full prompt text"""
+    return hashlib.sha256(chunk.text.encode('utf-8')).hexdigest()[:32]
+
+
+def chunk_key(document, content_hash):
+    return f"{document}#{content_hash}"
+
+
+def split_chunk_key(key):
+    """Inverse of ``chunk_key``: ``(document, content_hash)``"""
+    document, _, content_hash = key.rpartition('#')
+    return document, content_hash
+
+
+class IncrementalPlan:
+    """Diff of a document's new chunking against the chunks stored in the graph.
+
+    ``stored`` maps content hashes of chunks already in the graph to whether
+    they were completely written.  ``filter`` passes on only chunks whose
+    content is new or was not completely written, tagging each with its
+    provenance key; once it is exhausted ``removed`` lists the keys of stored
+    chunks that are no longer part of the document.  Chunks are matched by
+    content rather than position, and anchored chunking (see
+    ``chunker.iter_chunks``) keeps boundaries stable around an edit, so only
+    the few chunks it touches are re-analyzed, however far later chunks shift.
+    """
+
+    def __init__(self, document, stored):
+        self.document = document
+        self.stored = stored
+        self.current = set()
+        self.kept = 0
+
+    def filter(self, chunks):
+        for chunk_number, chunk in chunks:
+            content_hash = chunk_hash(chunk)
+            self.current.add(content_hash)
+            if self.stored.get(content_hash):
+                self.kept += 1
+                metrics.inc('chunks_unchanged')
+                continue
+            chunk.source_id = chunk_key(self.document, content_hash)
+            yield chunk_number, chunk
+
+    def removed(self):
+        return [
+            chunk_key(self.document, content_hash)
+            for content_hash in self.stored
+            if content_hash not in self.current
+        ]
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+import logging
+import random
+import time
+
+import openai
+
+from chunker import estimate_tokens
+from metrics import metrics
+from rate_limit import AdaptiveConcurrency
+
+logger = logging.getLogger(__name__)
+
+# Output tokens assumed for a request before the API reports real usage
+DEFAULT_OUTPUT_TOKENS = 1500
+
+
+class DeepSeekClient:
+    """Rate-limit-aware wrapper around an OpenAI-compatible client.
+
+    Every call waits for the shared ``RateLimiter`` budget and a slot from an
+    AIMD concurrency limit.  HTTP 429s shrink the limit and back off
+    (honouring ``Retry-After``); 5xx, timeouts and connection errors back off
+    with jitter without shrinking it.  Anything else, including responses
+    that fail to parse, is left to the caller.
+    """
+
+    def __init__(self, client, model, limiter=None, max_concurrency=32, max_retries=6,
+                 base_delay=1.0, max_delay=60.0):
+        self.client = client
+        self.model = model
+        self.limiter = limiter
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def complete(self, messages, **kwargs):
+        """Create a chat completion, retrying throttling and server errors"""
+        estimated = sum(estimate_tokens(m['content']) for m in messages) + DEFAULT_OUTPUT_TOKENS
+        for attempt in range(self.max_retries):
+            self._acquire(estimated)
+            try:
+                with metrics.time('llm_call'):
+                    response = self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        **kwargs
+                    )
+            except (openai.APIConnectionError, openai.APIStatusError) as e:
+                error = e
+                delay = self._retry_delay(e, attempt)
+            else:
+                self.concurrency.on_success()
+                self._record_usage(getattr(response, 'usage', None), estimated)
+                return response
+            finally:
+                self.concurrency.release()
+
+            if attempt == self.max_retries - 1:
+                raise error
+            metrics.inc('llm_retries')
+            time.sleep(delay)
+
+    def stream(self, messages, **kwargs):
+        """Stream a chat completion, yielding its content deltas
+
+        The concurrency slot is held and ``llm_call`` timed until the whole
+        body has been read, and the usage reported in the final event is
+        recorded.  Connection drops and server errors in the middle of a
+        stream are retried with the same backoff as ``complete``; since the
+        retried response starts over, None is yielded first to tell the
+        consumer to discard the deltas it has seen.
+        """
+        estimated = sum(estimate_tokens(m['content']) for m in messages) + DEFAULT_OUTPUT_TOKENS
+        for attempt in range(self.max_retries):
+            self._acquire(estimated)
+            started = False
+            try:
+                with metrics.time('llm_call'):
+                    response = self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        stream=True,
+                        stream_options={'include_usage': True},
+                        **kwargs
+                    )
+                    usage = None
+                    for event in response:
+                        usage = getattr(event, 'usage', None) or usage
+                        if not event.choices:
+                            continue
+                        delta = event.choices[0].delta.content
+                        if delta:
+                            started = True
+                            yield delta
+            except (openai.APIConnectionError, openai.APIStatusError) as e:
+                error = e
+                delay = self._retry_delay(e, attempt)
+            else:
+                self.concurrency.on_success()
+                self._record_usage(usage, estimated)
+                return
+            finally:
+                self.concurrency.release()
+
+            if attempt == self.max_retries - 1:
+                raise error
+            metrics.inc('llm_retries')
+            time.sleep(delay)
+            if started:
+                metrics.inc('llm_stream_restarts')
+                yield None
+
+    def _acquire(self, estimated):
+        if self.limiter is not None:
+            self.limiter.acquire(estimated)
+        self.concurrency.acquire()
+
+    def _record_usage(self, usage, estimated):
+        if usage is None:
+            return
+        metrics.inc('llm_prompt_tokens', usage.prompt_tokens or 0)
+        metrics.inc('llm_completion_tokens', usage.completion_tokens or 0)
+        if self.limiter is not None:
+            self.limiter.record_usage(usage.total_tokens, estimated)
+
+    def _retry_delay(self, error, attempt):
+        """Seconds to wait before retrying ``error``; re-raises errors not worth retrying"""
+        if isinstance(error, openai.RateLimitError):
+            metrics.inc('llm_throttled')
+            self.concurrency.on_throttle()
+            delay = self._retry_after(error) or self._backoff(attempt)
+            logger.warning(f"Rate limited (attempt {attempt + 1}), retrying in {delay:.1f}s")
+        elif isinstance(error, openai.APIConnectionError):
+            metrics.inc('llm_network_errors')
+            delay = self._backoff(attempt)
+            logger.warning(f"API unreachable (attempt {attempt + 1}): {error}, retrying in {delay:.1f}s")
+        elif error.status_code >= 500:
+            metrics.inc('llm_server_errors')
+            delay = self._backoff(attempt)
+            logger.warning(f"API error {error.status_code} (attempt {attempt + 1}), retrying in {delay:.1f}s")
+        else:
+            raise error
+        return delay
+
+    def _backoff(self, attempt):
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    @staticmethod
+    def _retry_after(error):
+        """Seconds requested by the server's Retry-After header, if any"""
+        response = getattr(error, 'response', None)
+        value = response.headers.get('retry-after') if response is not None else None
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+import atexit
+import copy
+import gzip
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import shutil
+
+# Record streams, chosen per call with ``extra={'stream': ...}``
+RESPONSE_STREAM = 'response'
+CONTEXT_STREAM = 'context'
+PAYLOAD_STREAMS = (RESPONSE_STREAM, CONTEXT_STREAM)
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+CONSOLE_FORMAT = '%(levelname)s:%(name)s:%(message)s'
+
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+
+
+class StreamFilter(logging.Filter):
+    """Pass records whose ``stream`` is in ``streams`` (or, with ``exclude``, is not)"""
+
+    def __init__(self, streams, exclude=False):
+        super().__init__()
+        self.streams = set(streams)
+        self.exclude = exclude
+
+    def filter(self, record):
+        return (getattr(record, 'stream', None) in self.streams) != self.exclude
+
+
+class PayloadSampler(logging.Filter):
+    """Keep only a fraction of payload records, before their message is formatted"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if getattr(record, 'stream', None) not in PAYLOAD_STREAMS:
+            return True
+        return self.rate >= 1.0 or random.random() < self.rate
+
+
+def _gzip_namer(name):
+    return name + '.gz'
+
+
+def _gzip_rotator(source, dest):
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def rotating_handler(path, max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT):
+    """Size-rotated file handler whose rotated files are gzip-compressed"""
+    handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True
+    )
+    handler.namer = _gzip_namer
+    handler.rotator = _gzip_rotator
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return handler
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread.
+
+    The stdlib handler formats every message on the producer before
+    enqueueing it.  For an in-process queue the record is passed on with its
+    ``msg`` and ``args`` untouched; only arguments with a ``snapshot()``
+    method are replaced by their snapshot, so state that keeps changing is
+    captured as it was when logged.  Records bound for another process are
+    formatted as usual, because their arguments have to be pickled.
+    """
+
+    def __init__(self, log_queue, local=True):
+        super().__init__(log_queue)
+        self.local = local
+
+    def prepare(self, record):
+        if not self.local:
+            return super().prepare(record)
+        record = copy.copy(record)
+        if isinstance(record.args, tuple):
+            record.args = tuple(
+                arg.snapshot() if hasattr(arg, 'snapshot') else arg for arg in record.args
+            )
+        return record
+
+
+class LogRouting:
+    """Owns the log queue and the listener thread that writes every stream.
+
+    Producers in this process only enqueue records; message formatting,
+    routing and file I/O all happen on the listener thread.  Worker
+    processes format their messages before sending them.  Records are
+    routed by their ``stream`` attribute:
+
+    - ``successful_responses.log``: full LLM responses (``response``)
+    - ``rolling_context.log``: prompt context and rolling-context dumps (``context``)
+    - ``error.log``: everything at ERROR and above
+    - ``complete_run.log`` and the console: everything except payloads
+    """
+
+    def __init__(self, log_queue, listener):
+        self.queue = log_queue
+        self.listener = listener
+
+    def stop(self):
+        """Flush queued records and stop the listener"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+
+def _attach(log_queue, level, payload_sample_rate):
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    local = isinstance(log_queue, (queue.Queue, queue.SimpleQueue))
+    queue_handler = DeferredQueueHandler(log_queue, local)
+    # Sample before any snapshot is taken or message formatted
+    queue_handler.addFilter(PayloadSampler(payload_sample_rate))
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+
+def configure_logging(log_dir='logs', level=logging.INFO, payload_sample_rate=1.0,
+                      max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT,
+                      log_queue=None):
+    """Route all logging through a queue to rotating per-stream files
+
+    ``payload_sample_rate`` is the fraction of response and context payloads
+    that are kept (0 disables them).  Pass a ``multiprocessing.Queue`` as
+    ``log_queue`` when worker processes will log through
+    ``attach_worker_logging``.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    log_queue = log_queue if log_queue is not None else queue.SimpleQueue()
+
+    def stream_handler(filename, streams, exclude=False, handler_level=logging.NOTSET):
+        handler = rotating_handler(os.path.join(log_dir, filename), max_bytes, backup_count)
+        handler.addFilter(StreamFilter(streams, exclude))
+        handler.setLevel(handler_level)
+        return handler
+
+    error_handler = rotating_handler(os.path.join(log_dir, 'error.log'), max_bytes, backup_count)
+    error_handler.setLevel(logging.ERROR)
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+    console.addFilter(StreamFilter(PAYLOAD_STREAMS, exclude=True))
+
+    listener = logging.handlers.QueueListener(
+        log_queue,
+        stream_handler('successful_responses.log', [RESPONSE_STREAM]),
+        stream_handler('rolling_context.log', [CONTEXT_STREAM]),
+        error_handler,
+        stream_handler('complete_run.log', PAYLOAD_STREAMS, exclude=True),
+        console,
+        respect_handler_level=True
+    )
+    listener.start()
+    _attach(log_queue, level, payload_sample_rate)
+
+    routing = LogRouting(log_queue, listener)
+    atexit.register(routing.stop)
+    return routing
+
+
+def attach_worker_logging(log_queue, level=logging.INFO, payload_sample_rate=1.0):
+    """Send a worker process's records to the parent's listener"""
+    _attach(log_queue, level, payload_sample_rate)
@@ -76,12 +76,116 @@ def stop_neo4j():
         print(f"Error stopping Neo4j: {e}")
         return False
 
+def bootstrap_schema():
+    """Create the constraints and indexes used by ingestion"""
+    from neo4j_connection import Neo4jConnection
+
+    try:
+        connection = Neo4jConnection(ensure_schema=False)
+        for statement in connection.ensure_schema():
+            print(f"Ensured: {statement}")
+        connection.driver.close()
+        return True
+    except Exception as e:
+        print(f"Error creating schema: {e}")
+        return False
+
+# Where docker-compose.yml mounts ./neo4j/import inside the container
+CONTAINER_IMPORT_DIR = "/var/lib/neo4j/import"
+
+def import_bulk(method="admin", overwrite=False, batch_size=10000):
+    """Load the CSVs written by ``process_document.py --bulk-export``
+
+    ``admin`` stops the server and runs ``neo4j-admin database import full``
+    into an empty database (``overwrite`` replaces an existing one), then
+    restarts it and recreates the schema.  ``load-csv`` merges the files into
+    the running database with LOAD CSV, committing every ``batch_size`` rows.
+    Either way CHILD_OF edges are then materialized from ``hierarchy_parent``.
+    """
+    from bulk_export import ARRAY_DELIMITER, CONCEPTS_FILE, RELATIONSHIPS_FILE, load_csv
+
+    if method == "load-csv":
+        from neo4j_connection import Neo4jConnection
+
+        try:
+            connection = Neo4jConnection()
+            nodes, relationships = load_csv(connection, batch_size=batch_size)
+            print(f"Loaded {nodes} new concepts and {relationships} new relationships")
+            edges = connection.materialize_hierarchy(batch_size)
+            print(f"Created {edges} CHILD_OF edges")
+            connection.driver.close()
+            return True
+        except Exception as e:
+            print(f"Error loading CSV files: {e}")
+            return False
+
+    command = [
+        "docker-compose", "run", "--rm", "--no-deps", "neo4j",
+        "neo4j-admin", "database", "import", "full",
+        f"--nodes=Concept={CONTAINER_IMPORT_DIR}/{CONCEPTS_FILE}",
+        f"--relationships=RELATES_TO={CONTAINER_IMPORT_DIR}/{RELATIONSHIPS_FILE}",
+        f"--array-delimiter={ARRAY_DELIMITER}",
+        # Descriptions and source_context are quoted and often span lines
+        "--multiline-fields=true",
+    ]
+    if overwrite:
+        command.append("--overwrite-destination")
+    command.append("neo4j")
+    # neo4j-admin needs exclusive access to the store files
+    if check_container_running() and not stop_neo4j():
+        return False
+    try:
+        subprocess.run(command, check=True)
+        print("Bulk import finished")
+    except subprocess.CalledProcessError as e:
+        print(f"Error running neo4j-admin import: {e}")
+        return False
+    return start_neo4j() and bootstrap_schema() and materialize_hierarchy(batch_size)
+
+def materialize_hierarchy(batch_size=10000):
+    """Create CHILD_OF edges for concepts that only have a hierarchy_parent property"""
+    from neo4j_connection import Neo4jConnection
+
+    try:
+        connection = Neo4jConnection()
+        edges = connection.materialize_hierarchy(batch_size)
+        connection.driver.close()
+        print(f"Created {edges} CHILD_OF edges")
+        return True
+    except Exception as e:
+        print(f"Error materializing hierarchy: {e}")
+        return False
+
+def run_analytics(batch_size=10000):
+    """Store PageRank, component and community labels on every concept"""
+    from graph_analytics import run_analytics as analyze
+    from neo4j_connection import Neo4jConnection
+
+    try:
+        connection = Neo4jConnection()
+        summary = analyze(connection, batch_size=batch_size)
+        connection.driver.close()
+        print(f"Scored {summary['concepts']} concepts over {summary['relationships']} relationships: "
+              f"{summary['components']} components, {summary['communities']} communities "
+              f"in {summary['seconds']}s")
+        return True
+    except Exception as e:
+        print(f"Error running graph analytics: {e}")
+        return False
+
 if __name__ == "__main__":
-    if len(sys.argv) != 2 or sys.argv[1] not in ["start", "stop", "status"]:
-        print("Usage: python manage_neo4j.py [start|stop|status]")
+    usage = ("Usage: python manage_neo4j.py [start|stop|status|schema|hierarchy|analytics|"
+             "import [admin|load-csv] [--overwrite]]")
+    commands = ["start", "stop", "status", "schema", "hierarchy", "analytics", "import"]
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print(usage)
         sys.exit(1)
         
     command = sys.argv[1]
+    options = sys.argv[2:]
+    if command != "import" and options:
+        print(usage)
+        sys.exit(1)
     
     if command == "start":
         success = start_neo4j()
@@ -93,3 +197,20 @@ if __name__ == "__main__":
         running = check_container_running()
         print(f"Neo4j container is {'running' if running else 'not running'}")
         sys.exit(0 if running else 1)
+    elif command == "schema":
+        success = bootstrap_schema()
+        sys.exit(0 if success else 1)
+    elif command == "hierarchy":
+        success = materialize_hierarchy()
+        sys.exit(0 if success else 1)
+    elif command == "analytics":
+        success = run_analytics()
+        sys.exit(0 if success else 1)
+    elif command == "import":
+        methods = [option for option in options if option in ["admin", "load-csv"]]
+        unknown = [option for option in options if option not in ["admin", "load-csv", "--overwrite"]]
+        if unknown or len(methods) > 1:
+            print(usage)
+            sys.exit(1)
+        success = import_bulk(methods[0] if methods else "admin", overwrite="--overwrite" in options)
+        sys.exit(0 if success else 1)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds in seconds, from sub-millisecond parsing up
+# to minute-long LLM calls
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Samples kept per stage for percentile estimates in the JSON summary
+RESERVOIR_SIZE = 4096
+
+PREFIX = 'kg_ingest'
+
+
+class _Timer:
+    """Cumulative histogram plus a reservoir sample of one stage's durations"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.samples = []
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+        if len(self.samples) < RESERVOIR_SIZE:
+            self.samples.append(seconds)
+        else:
+            slot = random.randrange(self.count)
+            if slot < RESERVOIR_SIZE:
+                self.samples[slot] = seconds
+
+    def merge(self, data):
+        self.count += data['count']
+        self.total += data['total']
+        self.buckets = [a + b for a, b in zip(self.buckets, data['buckets'])]
+        self.samples = (self.samples + data['samples'])[-RESERVOIR_SIZE:]
+
+    def percentile(self, pct):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+class Metrics:
+    """Thread-safe registry of per-stage timers and event counters.
+
+    Timers record how long each pipeline stage takes; counters record
+    events such as retries, validation failures, skipped chunks and API
+    token usage.  The registry renders itself in the Prometheus text format
+    and as a JSON run summary, and snapshots can be merged so worker
+    processes can report back to the parent.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timers = {}
+        self._counters = {}
+        self.started_at = datetime.now()
+
+    def observe(self, stage, seconds):
+        """Record one duration for ``stage``"""
+        with self._lock:
+            self._timers.setdefault(stage, _Timer()).observe(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        """Time the enclosed block as one observation of ``stage``"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def inc(self, name, amount=1):
+        """Increase counter ``name``"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def snapshot(self, reset=False):
+        """Return a mergeable, picklable copy of the current values"""
+        with self._lock:
+            data = {
+                'timers': {
+                    stage: {
+                        'count': timer.count,
+                        'total': timer.total,
+                        'buckets': list(timer.buckets),
+                        'samples': list(timer.samples)
+                    }
+                    for stage, timer in self._timers.items()
+                },
+                'counters': dict(self._counters)
+            }
+            if reset:
+                self._timers = {}
+                self._counters = {}
+            return data
+
+    def merge(self, data):
+        """Add a snapshot taken elsewhere, e.g. in a worker process"""
+        with self._lock:
+            for stage, timer_data in data['timers'].items():
+                self._timers.setdefault(stage, _Timer()).merge(timer_data)
+            for name, value in data['counters'].items():
+                self._counters[name] = self._counters.get(name, 0) + value
+
+    def summary(self):
+        """JSON-friendly summary with per-stage totals and percentiles"""
+        with self._lock:
+            return {
+                'started_at': self.started_at.isoformat(),
+                'finished_at': datetime.now().isoformat(),
+                'stages': {
+                    stage: {
+                        'count': timer.count,
+                        'total_seconds': timer.total,
+                        'mean_seconds': timer.total / timer.count if timer.count else 0.0,
+                        'p50_seconds': timer.percentile(50),
+                        'p90_seconds': timer.percentile(90),
+                        'p99_seconds': timer.percentile(99)
+                    }
+                    for stage, timer in sorted(self._timers.items())
+                },
+                'counters': dict(sorted(self._counters.items()))
+            }
+
+    def render_prometheus(self):
+        """Render all values in the Prometheus text exposition format"""
+        lines = [
+            f"# HELP {PREFIX}_stage_duration_seconds Time spent per pipeline stage",
+            f"# TYPE {PREFIX}_stage_duration_seconds histogram"
+        ]
+        with self._lock:
+            for stage, timer in sorted(self._timers.items()):
+                for bound, count in zip(BUCKETS, timer.buckets):
+                    lines.append(
+                        f'{PREFIX}_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}'
+                    )
+                lines.append(f'{PREFIX}_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {timer.count}')
+                lines.append(f'{PREFIX}_stage_duration_seconds_sum{{stage="{stage}"}} {timer.total}')
+                lines.append(f'{PREFIX}_stage_duration_seconds_count{{stage="{stage}"}} {timer.count}')
+            for name, value in sorted(self._counters.items()):
+                lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+                lines.append(f"{PREFIX}_{name}_total {value}")
+        return '\n'.join(lines) + '\n'
+
+    def write_files(self, directory):
+        """Write ``ingest.prom`` (atomically) and a timestamped JSON run summary"""
+        os.makedirs(directory, exist_ok=True)
+        _atomic_write(os.path.join(directory, 'ingest.prom'), self.render_prometheus())
+        summary_path = os.path.join(
+            directory, f"run-{self.started_at.strftime('%Y%m%d-%H%M%S')}.json"
+        )
+        _atomic_write(summary_path, json.dumps(self.summary(), indent=2))
+        return summary_path
+
+    def serve(self, port, host='0.0.0.0'):
+        """Expose ``/metrics`` over HTTP from a daemon thread"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') not in ('', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        return server
+
+
+def _atomic_write(path, text):
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.metrics-', suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+# Process-wide registry used by the ingestion pipeline
+metrics = Metrics()
@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+from neo4j import GraphDatabase
+from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
+import os
+import random
+import threading
+import time
+
+from incremental import split_chunk_key
+from metrics import metrics
+
+# Constraints and indexes the ingestion queries rely on.  The uniqueness
+# constraint also backs every MERGE/MATCH on Concept.name with an index.
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT concept_name_unique IF NOT EXISTS "
+    "FOR (c:Concept) REQUIRE c.name IS UNIQUE",
+    "CREATE INDEX concept_type IF NOT EXISTS "
+    "FOR (c:Concept) ON (c.type)",
+    "CREATE INDEX concept_hierarchy_parent IF NOT EXISTS "
+    "FOR (c:Concept) ON (c.hierarchy_parent)",
+    "CREATE INDEX relates_to_type IF NOT EXISTS "
+    "FOR ()-[r:RELATES_TO]-() ON (r.type)",
+    "CREATE CONSTRAINT chunk_key_unique IF NOT EXISTS "
+    "FOR (ch:Chunk) REQUIRE ch.key IS UNIQUE",
+    "CREATE INDEX chunk_document IF NOT EXISTS "
+    "FOR (ch:Chunk) ON (ch.document)",
+]
+
+CONCEPT_BATCH_QUERY = """
+UNWIND $rows AS row
+MERGE (c:Concept {name: row.name})
+REMOVE c.stub
+SET c.type = row.type,
+    c.description = row.description,
+    c.confidence = row.confidence,
+    c.source_position = row.source_position,
+    c.source_context = row.source_context,
+    c.hierarchy_parent = row.hierarchy_parent,
+    c.hierarchy_level = row.hierarchy_level,
+    c.version = row.version,
+    c.references = row.references,
+    c.aliases = reduce(acc = coalesce(c.aliases, []), alias IN row.aliases |
+        CASE WHEN alias IN acc THEN acc ELSE acc + alias END),
+    c.sources = CASE WHEN row.source IS NULL OR row.source IN coalesce(c.sources, [])
+        THEN c.sources ELSE coalesce(c.sources, []) + row.source END
+"""
+
+# Relationships are merged on (source, type, target).  Repeat sightings keep a
+# running mean of the scores and widen the first_seen/last_seen window
+# instead of adding parallel edges.  Edges written before sightings were
+# counted lack the property and count as one sighting.
+RELATIONSHIP_BATCH_QUERY = """
+UNWIND $rows AS row
+MATCH (source:Concept {name: row.source})
+MATCH (target:Concept {name: row.target})
+MERGE (source)-[r:RELATES_TO {type: row.type}]->(target)
+ON CREATE SET r.sightings = 0,
+    r.first_seen = row.first_seen,
+    r.last_seen = row.last_seen
+WITH r, row, coalesce(r.sightings, 1) AS n
+SET r.confidence = (coalesce(r.confidence, row.confidence) * n + row.confidence) / (n + 1),
+    r.forward_strength = (coalesce(r.forward_strength, row.forward_strength) * n
+        + row.forward_strength) / (n + 1),
+    r.backward_strength = (coalesce(r.backward_strength, row.backward_strength) * n
+        + row.backward_strength) / (n + 1),
+    r.sightings = n + 1,
+    r.first_seen = CASE WHEN r.first_seen IS NULL OR row.first_seen < r.first_seen
+        THEN row.first_seen ELSE r.first_seen END,
+    r.last_seen = CASE WHEN r.last_seen IS NULL OR row.last_seen > r.last_seen
+        THEN row.last_seen ELSE r.last_seen END,
+    r.category = row.category,
+    r.directness = row.directness,
+    r.strength = row.strength,
+    r.source_context = row.source_context,
+    r.extraction_method = row.extraction_method,
+    r.sources = CASE WHEN row.source IS NULL OR row.source IN coalesce(r.sources, [])
+        THEN r.sources ELSE coalesce(r.sources, []) + row.source END
+SET r += row.properties
+"""
+
+# Materializes c.hierarchy_parent as a CHILD_OF edge, replacing an edge to a
+# previous parent.  Parents not extracted yet are created as stub concepts,
+# flagged with ``stub`` until they are written themselves.
+HIERARCHY_BATCH_QUERY = """
+UNWIND $rows AS row
+MATCH (child:Concept {name: row.name})
+MERGE (parent:Concept {name: row.parent})
+ON CREATE SET parent.stub = true
+MERGE (child)-[:CHILD_OF]->(parent)
+WITH child, parent
+MATCH (child)-[old:CHILD_OF]->(other:Concept)
+WHERE other <> parent
+DELETE old
+"""
+
+# Backfills CHILD_OF edges for graphs written before they were materialized,
+# or loaded through bulk import
+HIERARCHY_BACKFILL_QUERY = """
+MATCH (child:Concept)
+WHERE child.hierarchy_parent IS NOT NULL AND child.hierarchy_parent <> child.name
+CALL {
+    WITH child
+    MERGE (parent:Concept {name: child.hierarchy_parent})
+    ON CREATE SET parent.stub = true
+    MERGE (child)-[:CHILD_OF]->(parent)
+} IN TRANSACTIONS OF $batch_size ROWS
+"""
+
+# Incremental mode: each analyzed chunk is a Chunk node that MENTIONS every
+# concept it wrote or used as a relationship endpoint, so retracting it only
+# touches those concepts and their relationships.  Concepts and relationships
+# list the chunk keys that contributed them in ``sources``.
+CHUNK_MENTIONS_QUERY = """
+MERGE (ch:Chunk {key: $key})
+ON CREATE SET ch.document = $document, ch.hash = $hash, ch.complete = false
+WITH ch
+UNWIND $names AS name
+MATCH (c:Concept {name: name})
+MERGE (ch)-[:MENTIONS]->(c)
+"""
+
+CHUNK_COMPLETE_QUERY = """
+UNWIND $rows AS row
+MERGE (ch:Chunk {key: row.key})
+SET ch.document = row.document, ch.hash = row.hash, ch.complete = true
+"""
+
+DOCUMENT_CHUNKS_QUERY = """
+MATCH (ch:Chunk {document: $document})
+RETURN ch.hash AS hash, ch.complete AS complete
+"""
+
+# Retraction runs as these statements, in order, in one transaction
+RETRACT_CHUNKS_QUERIES = [
+    """
+    UNWIND $keys AS key
+    MATCH (:Chunk {key: key})-[:MENTIONS]->(:Concept)-[r:RELATES_TO]-()
+    WHERE key IN r.sources
+    WITH DISTINCT r, key
+    SET r.sources = [source IN r.sources WHERE source <> key],
+        r.sightings = CASE WHEN r.sightings > 1 THEN r.sightings - 1 ELSE r.sightings END
+    """,
+    """
+    UNWIND $keys AS key
+    MATCH (:Chunk {key: key})-[:MENTIONS]->(:Concept)-[r:RELATES_TO]-()
+    WHERE r.sources = []
+    WITH DISTINCT r
+    DELETE r
+    """,
+    """
+    UNWIND $keys AS key
+    MATCH (:Chunk {key: key})-[:MENTIONS]->(c:Concept)
+    WHERE key IN c.sources
+    SET c.sources = [source IN c.sources WHERE source <> key]
+    """,
+    # Concepts still connected keep their node; they may be referred to
+    # by documents ingested without provenance.  Stub parents left without
+    # children or relationships go with them.
+    """
+    UNWIND $keys AS key
+    MATCH (:Chunk {key: key})-[:MENTIONS]->(c:Concept)
+    WHERE c.sources = [] AND NOT EXISTS { (c)-[:RELATES_TO]-() }
+    WITH DISTINCT c
+    OPTIONAL MATCH (c)-[:CHILD_OF]->(parent:Concept {stub: true})
+    WITH collect(DISTINCT c) AS doomed, collect(DISTINCT parent) AS parents
+    WITH doomed, [parent IN parents WHERE NOT parent IN doomed] AS parents
+    FOREACH (c IN doomed | DETACH DELETE c)
+    WITH parents
+    UNWIND parents AS parent
+    WITH parent
+    WHERE NOT EXISTS { ()-[:CHILD_OF]->(parent) }
+      AND NOT EXISTS { (parent)-[:RELATES_TO]-() }
+    DETACH DELETE parent
+    """,
+    """
+    UNWIND $keys AS key
+    MATCH (ch:Chunk {key: key})
+    DETACH DELETE ch
+    """,
+]
+
+CONCEPT_NAMES_QUERY = """
+MATCH (c:Concept)
+RETURN c.name AS name, coalesce(c.aliases, []) AS aliases
+"""
+
+# Strongest relationships of each named concept, in either direction
+NEIGHBORS_QUERY = """
+UNWIND $names AS name
+MATCH (c:Concept {name: name})-[r:RELATES_TO]-(other:Concept)
+WITH name, r, other, startNode(r) = c AS outgoing
+ORDER BY r.confidence DESC
+WITH name, collect({name: other.name, type: r.type, outgoing: outgoing})[..$limit] AS neighbors
+RETURN name, neighbors
+"""
+
+# Errors worth retrying: the server or cluster is briefly unable to serve the
+# transaction.  Anything else (syntax, constraint, auth) fails immediately.
+RETRYABLE_ERRORS = (TransientError, ServiceUnavailable, SessionExpired)
+
+def batched(items, size):
+    """Yield successive lists of at most ``size`` items"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+class Neo4jConnection:
+    """Pooled Neo4j driver with the ingestion and read queries.
+
+    One driver, and so one connection pool, lives as long as the connection
+    object.  Work runs in driver-managed transaction functions, which already
+    retry transient errors inside a transaction; ``execute_with_retry`` adds
+    a few jittered retries around whole operations for errors raised while
+    acquiring a connection.  Only transient and availability errors are
+    retried, and the pool is never torn down: the driver replaces broken
+    connections on its own.  Pool settings come from the arguments or the
+    NEO4J_MAX_POOL_SIZE, NEO4J_ACQUISITION_TIMEOUT and NEO4J_KEEP_ALIVE
+    environment variables.
+    """
+
+    def __init__(self, batch_size=None, ensure_schema=True, max_pool_size=None,
+                 acquisition_timeout=None, keep_alive=None, max_retries=3,
+                 base_delay=0.2, max_delay=5.0):
+        self.uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+        self.auth = (
+            os.getenv("NEO4J_USER", "neo4j"),
+            os.getenv("NEO4J_PASSWORD")
+        )
+        # Maximum number of rows sent per UNWIND statement
+        self.batch_size = batch_size or int(os.getenv("NEO4J_BATCH_SIZE", "500"))
+        self.max_pool_size = max_pool_size or int(os.getenv("NEO4J_MAX_POOL_SIZE", "100"))
+        self.acquisition_timeout = acquisition_timeout or float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "60"))
+        if keep_alive is None:
+            keep_alive = os.getenv("NEO4J_KEEP_ALIVE", "true").lower() not in ("0", "false", "no")
+        self.keep_alive = keep_alive
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.driver = None
+        # Bumped after every successful write so read-side caches can tell
+        # their results are stale; see graph_queries.GraphQueries
+        self.write_generation = 0
+        self._health_lock = threading.Lock()
+        self._health = {
+            'active_sessions': 0,
+            'peak_active_sessions': 0,
+            'sessions_opened': 0,
+            'retries': 0,
+            'transient_errors': 0,
+            'unavailable_errors': 0,
+            'failed_operations': 0
+        }
+        self.connect()
+        if ensure_schema:
+            self.ensure_schema()
+
+    def connect(self):
+        """Establish connection to Neo4j"""
+        try:
+            if self.driver:
+                self.driver.close()
+            self.driver = GraphDatabase.driver(
+                self.uri,
+                auth=self.auth,
+                max_connection_lifetime=300,  # 5 minutes
+                max_connection_pool_size=self.max_pool_size,
+                connection_acquisition_timeout=self.acquisition_timeout,
+                keep_alive=self.keep_alive
+            )
+            print("Connected to Neo4j")
+        except Exception as e:
+            print(f"Failed to connect to Neo4j: {e}")
+            raise
+
+    def close(self):
+        if self.driver:
+            self.driver.close()
+            self.driver = None
+
+    def ensure_schema(self):
+        """Create the constraints and indexes used by ingestion if missing"""
+        def operation(session):
+            for statement in SCHEMA_STATEMENTS:
+                session.run(statement).consume()
+        self.execute_with_retry(operation)
+        return SCHEMA_STATEMENTS
+
+    def pool_health(self):
+        """Snapshot of session and retry counters plus the pool settings"""
+        with self._health_lock:
+            health = dict(self._health)
+        health['max_pool_size'] = self.max_pool_size
+        return health
+
+    def _count(self, name, amount=1):
+        with self._health_lock:
+            self._health[name] += amount
+            if name == 'active_sessions':
+                self._health['peak_active_sessions'] = max(
+                    self._health['peak_active_sessions'], self._health['active_sessions']
+                )
+
+    def execute_with_retry(self, operation, max_retries=None):
+        """Run ``operation(session)`` on a pooled session, retrying transient failures
+
+        Transient and availability errors are retried up to ``max_retries``
+        attempts in all, after exponential backoff with full jitter; other
+        errors are raised at once.
+        """
+        max_retries = max_retries or self.max_retries
+        for attempt in range(max_retries):
+            self._count('sessions_opened')
+            self._count('active_sessions')
+            try:
+                with self.driver.session() as session:
+                    return operation(session)
+            except RETRYABLE_ERRORS as e:
+                self._count('transient_errors' if isinstance(e, TransientError) else 'unavailable_errors')
+                if attempt == max_retries - 1:
+                    self._count('failed_operations')
+                    metrics.inc('neo4j_failures')
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                print(f"Neo4j operation failed (attempt {attempt + 1}): {e}, retrying in {delay:.2f}s")
+                self._count('retries')
+                metrics.inc('neo4j_retries')
+                time.sleep(delay)
+            except Exception:
+                self._count('failed_operations')
+                metrics.inc('neo4j_failures')
+                raise
+            finally:
+                self._count('active_sessions', -1)
+
+    def read(self, work, *args, max_retries=None, **kwargs):
+        """Run ``work(tx, ...)`` as a driver-managed read transaction"""
+        return self.execute_with_retry(
+            lambda session: session.execute_read(work, *args, **kwargs), max_retries
+        )
+
+    def write(self, work, *args, max_retries=None, **kwargs):
+        """Run ``work(tx, ...)`` as a driver-managed write transaction"""
+        return self.execute_with_retry(
+            lambda session: session.execute_write(work, *args, **kwargs), max_retries
+        )
+
+    def create_concept_node(self, concept):
+        """Create or update a concept node with enhanced metadata"""
+        return self.write_chunk_result([concept], [])
+
+    def create_relationship(self, rel):
+        """Create or merge a relationship between concepts with enhanced metadata"""
+        return self.write_chunk_result([], [rel])
+
+    def write_chunk_result(self, concepts, relationships, batch_size=None, source=None):
+        """Write a chunk's concepts and relationships in one managed transaction.
+
+        Each list is sent as UNWIND statements of at most ``batch_size`` rows,
+        so a chunk costs a handful of round trips instead of one per item.
+        Concepts are written first so relationships can match their endpoints.
+        With a ``source`` chunk key (incremental mode) every row records it as
+        provenance and the chunk's Chunk node MENTIONS what it touched.
+        """
+        return self.write_chunk_results([(concepts, relationships, source)], batch_size)
+
+    def write_chunk_results(self, results, batch_size=None):
+        """Group-commit several chunks' ``(concepts, relationships, source)`` in one transaction
+
+        The chunks' rows are concatenated in order, so this costs about as
+        many round trips as writing the largest of them alone.
+        """
+        batch_size = batch_size or self.batch_size
+        concepts = []
+        relationships = []
+        hierarchy = []
+        mentioned = {}
+        for chunk_concepts, chunk_relationships, source in results:
+            if source is not None:
+                names = mentioned.setdefault(source, set())
+                names.update(concept.name for concept in chunk_concepts)
+                for rel in chunk_relationships:
+                    names.update((rel.source, rel.target))
+            hierarchy.extend(
+                {'name': concept.name, 'parent': concept.hierarchy_parent}
+                for concept in chunk_concepts
+                if concept.hierarchy_parent and concept.hierarchy_parent != concept.name
+            )
+            concepts.extend(dict(concept.to_row(), source=source) for concept in chunk_concepts)
+            relationships.extend(dict(rel.to_row(), source=source) for rel in chunk_relationships)
+
+        def work(tx):
+            for batch in batched(concepts, batch_size):
+                tx.run(CONCEPT_BATCH_QUERY, rows=batch).consume()
+            for batch in batched(hierarchy, batch_size):
+                tx.run(HIERARCHY_BATCH_QUERY, rows=batch).consume()
+            for batch in batched(relationships, batch_size):
+                tx.run(RELATIONSHIP_BATCH_QUERY, rows=batch).consume()
+            for source, names in mentioned.items():
+                document, content_hash = split_chunk_key(source)
+                for batch in batched(sorted(names), batch_size):
+                    tx.run(CHUNK_MENTIONS_QUERY, key=source, document=document,
+                           hash=content_hash, names=batch).consume()
+
+        with metrics.time('neo4j_write'):
+            result = self.write(work)
+        self.write_generation += 1
+        metrics.inc('neo4j_rows_written', len(concepts) + len(relationships))
+        return result
+
+    def materialize_hierarchy(self, batch_size=10000):
+        """Create CHILD_OF edges for every concept with a hierarchy parent"""
+        def operation(session):
+            # CALL ... IN TRANSACTIONS needs an auto-commit transaction
+            return session.run(HIERARCHY_BACKFILL_QUERY, batch_size=batch_size).consume()
+        with metrics.time('neo4j_write'):
+            summary = self.execute_with_retry(operation)
+        self.write_generation += 1
+        return summary.counters.relationships_created
+
+    def fetch_neighbors(self, names, limit=5):
+        """Return ``{name: [{name, type, outgoing}, ...]}`` in one read transaction"""
+        def work(tx):
+            return tx.run(NEIGHBORS_QUERY, names=list(names), limit=limit).data()
+
+        with metrics.time('neo4j_read'):
+            # Callers treat neighbors as optional, so fail fast instead of backing off
+            rows = self.read(work, max_retries=1)
+        return {row['name']: row['neighbors'] for row in rows}
+
+    def fetch_document_chunks(self, document):
+        """Return ``{content_hash: complete}`` for the stored chunks of a document"""
+        def work(tx):
+            return {
+                record['hash']: bool(record['complete'])
+                for record in tx.run(DOCUMENT_CHUNKS_QUERY, document=document)
+            }
+
+        with metrics.time('neo4j_read'):
+            return self.read(work)
+
+    def complete_chunks(self, keys):
+        """Mark chunks as completely written, creating nodes for empty ones"""
+        rows = [dict(zip(('document', 'hash'), split_chunk_key(key)), key=key) for key in keys]
+
+        def work(tx):
+            for batch in batched(rows, self.batch_size):
+                tx.run(CHUNK_COMPLETE_QUERY, rows=batch).consume()
+
+        with metrics.time('neo4j_write'):
+            self.write(work)
+        self.write_generation += 1
+
+    def retract_chunks(self, keys):
+        """Remove the contributions of chunks that left their document
+
+        Provenance is stripped from everything the chunks mentioned, then
+        relationships and unconnected concepts with no provenance left are
+        deleted, all in one transaction.
+        """
+        keys = list(keys)
+
+        def work(tx):
+            for batch in batched(keys, self.batch_size):
+                for query in RETRACT_CHUNKS_QUERIES:
+                    tx.run(query, keys=batch).consume()
+
+        with metrics.time('neo4j_retract'):
+            self.write(work)
+        self.write_generation += 1
+        metrics.inc('chunks_retracted', len(keys))
+
+    def fetch_concept_names(self):
+        """Return ``[(name, aliases), ...]`` for every concept in the graph"""
+        def work(tx):
+            return [(record['name'], record['aliases']) for record in tx.run(CONCEPT_NAMES_QUERY)]
+
+        with metrics.time('neo4j_read'):
+            return self.read(work)
+
+    def __del__(self):
+        """Cleanup connection on object destruction"""
+        self.close()
@@ -3,423 +3,992 @@ from openai import OpenAI
 from dotenv import load_dotenv
 import os
 from lxml import etree as ET
-from neo4j import GraphDatabase
-import time
 import logging
 import json
+import time
+import glob
+import multiprocessing
+import sys
+from concurrent.futures import (
+    ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+)
 from datetime import datetime
 
-# Create logs directory if it doesn't exist
-os.makedirs('logs', exist_ok=True)
+from analysis_parser import (
+    DEFAULT_SCHEMA_PATH, element_to_concept, element_to_relationship, get_parser, salvage_element
+)
+from bulk_export import DEFAULT_IMPORT_DIR, BulkExporter, clear_parts, finalize_export
+from chunker import iter_chunks
+from context_store import ContextStore
+from incremental import IncrementalPlan, document_id
+from entity_resolution import DEFAULT_THRESHOLD, EntityResolver
+from llm_client import DeepSeekClient
+from logging_setup import (
+    CONTEXT_STREAM, RESPONSE_STREAM, attach_worker_logging, configure_logging
+)
+from metrics import metrics
+from write_behind import WriteBehindWriter
+from neo4j_connection import Neo4jConnection
+from response_formats import RESPONSE_FORMATS, get_response_format
+from rate_limit import RateLimiter
+from response_cache import ResponseCache
+from similarity_index import LINK_THRESHOLD, SimilarityIndex
+from run_manifest import RunManifest, default_manifest_path
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+# Handlers are set up by logging_setup.configure_logging; records tagged with
+# one of these extras are routed to their own log file
 logger = logging.getLogger(__name__)
+RESPONSE_LOG = {'stream': RESPONSE_STREAM}
+CONTEXT_LOG = {'stream': CONTEXT_STREAM}
 
-# Create file handlers for different log types
-success_handler = logging.FileHandler('logs/successful_responses.log')
-error_handler = logging.FileHandler('logs/error.log')
-rolling_handler = logging.FileHandler('logs/rolling_context.log')
-complete_handler = logging.FileHandler('logs/complete_run.log')
-
-# Set formats for each handler
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-success_handler.setFormatter(formatter)
-error_handler.setFormatter(formatter)
-rolling_handler.setFormatter(formatter)
-complete_handler.setFormatter(formatter)
-
-# Add handlers to logger
-logger.addHandler(success_handler)
-logger.addHandler(error_handler)
-logger.addHandler(rolling_handler)
-logger.addHandler(complete_handler)
+class JsonDump:
+    """Defers building and dumping a value until a log record is actually formatted"""
+
+    def __init__(self, build):
+        self.build = build
+        self._text = None
+
+    def snapshot(self):
+        """Build the value now and leave only the dump for the log listener"""
+        value = self.build()
+        return JsonDump(lambda: value)
+
+    def __str__(self):
+        # Rotating handlers format a record twice: once to check the size
+        if self._text is None:
+            self._text = json.dumps(self.build(), indent=2)
+        return self._text
 
 # Load environment variables
 load_dotenv()
 
 
+def create_client():
+    """Create the OpenAI client for Deepseek"""
+    return OpenAI(
+        api_key=os.getenv("DEEPSEEK_API_KEY"),
+        base_url="https://api.deepseek.com"
+    )
+
 # Initialize OpenAI client for Deepseek
-client = OpenAI(
-    api_key=os.getenv("DEEPSEEK_API_KEY"),
-    base_url="https://api.deepseek.com"
-)
+client = create_client()
+MODEL_NAME = "deepseek-chat"
 
-class Neo4jConnection:
-    def __init__(self):
-        self.uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-        self.auth = (
-            os.getenv("NEO4J_USER", "neo4j"),
-            os.getenv("NEO4J_PASSWORD")
-        )
-        self.driver = None
-        self.connect()
+# Rate-limited, adaptively concurrent wrapper used for every API call
+llm = DeepSeekClient(client, MODEL_NAME)
 
-    def connect(self):
-        """Establish connection to Neo4j"""
-        try:
-            if self.driver:
-                self.driver.close()
-            self.driver = GraphDatabase.driver(
-                self.uri,
-                auth=self.auth,
-                max_connection_lifetime=300  # 5 minutes
-            )
-            print("Connected to Neo4j")
-        except Exception as e:
-            print(f"Failed to connect to Neo4j: {e}")
-            raise
+# Keep the usable parts of responses that fail validation instead of
+# re-requesting the whole chunk
+salvage_responses = True
 
-    def execute_with_retry(self, operation, max_retries=3):
-        """Execute Neo4j operation with retry logic"""
-        for attempt in range(max_retries):
-            try:
-                with self.driver.session() as session:
-                    return operation(session)
-            except Exception as e:
-                print(f"Neo4j operation failed (attempt {attempt + 1}): {e}")
-                if attempt < max_retries - 1:
-                    print("Attempting to reconnect...")
-                    time.sleep(2 ** attempt)  # Exponential backoff
-                    self.connect()
-                else:
-                    raise
-
-    def create_concept_node(self, concept):
-        """Create or update a concept node with enhanced metadata"""
-        query = """
-        MERGE (c:Concept {name: $name})
-        SET c.type = $type,
-            c.description = $description,
-            c.confidence = $confidence,
-            c.source_position = $source.position,
-            c.source_context = $source.context,
-            c.hierarchy_parent = $hierarchy.parent,
-            c.hierarchy_level = $hierarchy.level,
-            c.version = $version,
-            c.references = $references
-        """
-        def operation(session):
-            return session.run(query, concept)
-        return self.execute_with_retry(operation)
-
-    def create_relationship(self, rel):
-        """Create a relationship between concepts with enhanced metadata"""
-        query = """
-        MATCH (source:Concept {name: $source})
-        MATCH (target:Concept {name: $target})
-        CREATE (source)-[r:RELATES_TO {
-            type: $type,
-            confidence: $metadata.confidence,
-            forward_strength: $metadata.bidirectional_strength.forward,
-            backward_strength: $metadata.bidirectional_strength.backward,
-            first_seen: $metadata.temporal.first_seen,
-            last_seen: $metadata.temporal.last_seen,
-            category: $metadata.classification.category,
-            directness: $metadata.classification.directness,
-            strength: $metadata.classification.strength,
-            source_context: $metadata.provenance.source_context,
-            extraction_method: $metadata.provenance.extraction_method
-        }]->(target)
-        SET r += $properties
-        """
-        def operation(session):
-            return session.run(query, rel)
-        return self.execute_with_retry(operation)
-
-    def __del__(self):
-        """Cleanup connection on object destruction"""
-        if self.driver:
-            self.driver.close()
-
-def validate_xml_response(xml_content, schema_path='schema.xsd'):
+# Response format requested from the model; see response_formats.py
+response_format = get_response_format('xml')
+
+# Maps name spellings onto canonical concept names before writing; None disables
+resolver = EntityResolver()
+
+# Proposes cross-chunk relationships between similar concepts; None disables
+similarity = None
+similarity_k = 5
+similarity_threshold = LINK_THRESHOLD
+
+def configure_similarity(path=None, k=5, threshold=LINK_THRESHOLD):
+    """Open the persistent similarity index at ``path``, or disable linking without one"""
+    global similarity, similarity_k, similarity_threshold
+    if similarity is not None:
+        similarity.close()
+    similarity = SimilarityIndex(path) if path else None
+    similarity_k = k
+    similarity_threshold = threshold
+    if similarity is not None:
+        logger.info(f"Similarity index at {path} holds {len(similarity)} concepts")
+    return similarity
+
+def propose_links(concepts):
+    """Candidate relationships from a chunk's concepts to similar concepts seen before"""
+    if similarity is None or not concepts:
+        return []
+    with metrics.time('similarity_link'):
+        return similarity.link(concepts, k=similarity_k, threshold=similarity_threshold)
+
+def configure_resolver(neo4j=None, enabled=True, threshold=DEFAULT_THRESHOLD):
+    """Replace the entity resolver, warming it from the graph when ``neo4j`` is given"""
+    global resolver
+    resolver = EntityResolver(threshold) if enabled else None
+    if resolver is not None and neo4j is not None:
+        with metrics.time('resolver_warmup'):
+            count = resolver.warm(neo4j)
+        logger.info(f"Entity resolver warmed with {count} concepts from the graph")
+    return resolver
+
+def configure_llm(limiter=None, max_concurrency=32):
+    """Replace the API wrapper, e.g. to share a RateLimiter across workers"""
+    global llm
+    llm = DeepSeekClient(client, MODEL_NAME, limiter=limiter, max_concurrency=max_concurrency)
+    return llm
+
+def validate_xml_response(xml_content, schema_path=DEFAULT_SCHEMA_PATH):
     """Validate XML against schema"""
-    try:
-        schema_doc = ET.parse(schema_path)
-        schema = ET.XMLSchema(schema_doc)
-        parser = ET.XMLParser(schema=schema)
-        ET.fromstring(xml_content.encode('utf-8'), parser)
-        return True
-    except Exception as e:
-        print(f"XML validation failed: {e}")
+    with metrics.time('validate'):
+        if get_parser(schema_path).is_valid(xml_content):
+            return True
+        logger.warning("XML validation failed")
+        metrics.inc('validation_failures')
         return False
 
 def escape_xml_chars(text):
     """Escape special characters for XML"""
     return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;').replace("'", '&apos;')
 
-def ensure_integer_position(position):
-    """Convert position to integer, defaulting to chunk_number * 1000 if not a valid integer"""
-    try:
-        return int(position)
-    except (ValueError, TypeError):
-        return 1000  # Default position if not a valid integer
-
-def analyze_chunk(chunk, context, chunk_number):
-    """Process document chunk with Deepseek AI"""
-    system_prompt = """
-    Analyze technical documentation and return results in the following XML format:
-    <analysis>
-        <concepts>
-            <concept>
-                <name>concept_name</name>
-                <type>concept_type</type>
-                <description>description</description>
-                <confidence>0.95</confidence>
-                <source>
-                    <position>1234</position>
-                    <context>surrounding text for context</context>
-                </source>
-                <hierarchy>
-                    <parent>parent_concept</parent>
-                    <level>1</level>
-                </hierarchy>
-                <version>1</version>
-                <references>
-                    <reference>related_concept</reference>
-                </references>
-            </concept>
-        </concepts>
-        <relationships>
-            <relationship>
-                <source>source_concept</source>
-                <type>relationship_type</type>
-                <target>target_concept</target>
-                <metadata>
-                    <confidence>0.90</confidence>
-                    <bidirectional_strength>
-                        <forward>0.85</forward>
-                        <backward>0.75</backward>
-                    </bidirectional_strength>
-                    <temporal>
-                        <first_seen>2024-01-26T13:45:00Z</first_seen>
-                        <last_seen>2024-01-26T13:45:00Z</last_seen>
-                    </temporal>
-                    <classification>
-                        <category>dependency</category>
-                        <directness>direct</directness>
-                        <strength>strong</strength>
-                    </classification>
-                    <provenance>
-                        <source_context>contextual information</source_context>
-                        <extraction_method>deepseek_analysis</extraction_method>
-                    </provenance>
-                </metadata>
-                <properties>
-                    <property name="additional_info">value</property>
-                </properties>
-            </relationship>
-        </relationships>
-    </analysis>
-
-    Guidelines for analysis:
-    1. Assign confidence scores based on clarity and context
-    2. Use hierarchical classification for concepts
-    3. Track relationship directionality and strength
-    4. Provide detailed context for provenance
-    5. Classify relationships by type and directness
+# Characters of chunk text kept as a concept's source context when the model gives none
+SOURCE_CONTEXT_CHARS = 160
+
+def resolve_source_positions(concepts, chunk, context_chars=SOURCE_CONTEXT_CHARS):
+    """Turn the model's chunk-relative positions into absolute character offsets
+
+    Positions outside the chunk are replaced by the first mention of the
+    concept name in the chunk, or the start of the chunk's new content.
+    Concepts without a source context (the compact format does not ask for
+    one) get ``context_chars`` of chunk text around that position.
     """
-    
-    response = client.chat.completions.create(
-        model="deepseek-chat",
-        messages=[
-            {"role": "system", "content": system_prompt},
+    lowered = None
+    for concept in concepts:
+        position = concept.source_position
+        if position is None or not 0 <= position < len(chunk.text):
+            if lowered is None:
+                lowered = chunk.text.lower()
+            found = lowered.find((concept.name or '').lower())
+            position = found if found >= 0 else chunk.body_start_char - chunk.start_char
+        if concept.source_context is None:
+            start = max(0, position - context_chars // 2)
+            concept.source_context = chunk.text[start:start + context_chars].strip()
+        concept.source_position = chunk.start_char + position
+    return concepts
+
+
+def build_messages(context, chunk):
+    """Build the chat messages for one chunk"""
+    with metrics.time('prompt_build'):
+        return [
+            {"role": "system", "content": response_format.system_prompt},
             {"role": "user", "content": f"Context: {escape_xml_chars(context)}\n\nChunk: {escape_xml_chars(chunk)}"}
-        ],
-        stream=False
+        ]
+
+def analyze_chunk(chunk, context, chunk_number, cache=None):
+    """Process document chunk with Deepseek AI, consulting the response cache first"""
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(MODEL_NAME, response_format.system_prompt, context, chunk)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            try:
+                result = parse_response(cached)
+                logger.info(f"Cache hit for chunk {chunk_number}")
+                metrics.inc('cache_hits')
+                return result
+            except ValueError:
+                # Stale entry from an older schema; fall through to the API
+                cache.discard(cache_key)
+        metrics.inc('cache_misses')
+
+    response = llm.complete(
+        messages=build_messages(context, chunk),
+        stream=False,
+        **response_format.request_options
     )
     response_content = response.choices[0].message.content
     
     # Log successful response
-    logger.info(f"Successful response for chunk {chunk_number}:\n{response_content}")
+    logger.info("Successful response for chunk %s:\n%s", chunk_number, response_content,
+                extra=RESPONSE_LOG)
     
-    return parse_xml_response(response_content)
+    result = parse_response(response_content)
+    if cache is not None:
+        # Only responses that parsed are worth replaying
+        cache.put(cache_key, response_content)
+    return result
 
-def parse_xml_response(xml_content):
-    """Parse XML response into structured data with enhanced metadata"""
-    if not validate_xml_response(xml_content):
-        raise ValueError("Invalid XML response")
-    
-    root = ET.fromstring(xml_content.encode('utf-8'))
-    
-    # Extract concepts with enhanced metadata
-    concepts = []
-    for concept in root.findall('./concepts/concept'):
-        source_elem = concept.find('source')
-        hierarchy_elem = concept.find('hierarchy')
-        
-        concepts.append({
-            'name': concept.find('name').text,
-            'type': concept.find('type').text,
-            'description': concept.find('description').text,
-            'confidence': float(concept.find('confidence').text),
-            'source': {
-                'position': ensure_integer_position(source_elem.find('position').text),
-                'context': source_elem.find('context').text
-            },
-            'hierarchy': {
-                'parent': hierarchy_elem.find('parent').text if hierarchy_elem.find('parent') is not None else None,
-                'level': int(hierarchy_elem.find('level').text)
-            },
-            'version': int(concept.find('version').text),
-            'references': [ref.text for ref in concept.findall('./references/reference')]
-        })
-    
-    # Extract relationships with enhanced metadata
-    relationships = []
-    for rel in root.findall('./relationships/relationship'):
-        metadata_elem = rel.find('metadata')
-        temporal_elem = metadata_elem.find('temporal')
-        classification_elem = metadata_elem.find('classification')
-        strength_elem = metadata_elem.find('bidirectional_strength')
-        provenance_elem = metadata_elem.find('provenance')
-        
-        # Get properties or create empty dict if missing
-        properties = {
-            prop.get('name'): prop.text
-            for prop in rel.findall('./properties/property')
-        }
-        if not properties:
-            properties = {'default': 'No additional properties'}
-
-        relationships.append({
-            'source': rel.find('source').text,
-            'type': rel.find('type').text,
-            'target': rel.find('target').text,
-            'metadata': {
-                'confidence': float(metadata_elem.find('confidence').text),
-                'bidirectional_strength': {
-                    'forward': float(strength_elem.find('forward').text),
-                    'backward': float(strength_elem.find('backward').text)
-                },
-                'temporal': {
-                    'first_seen': temporal_elem.find('first_seen').text,
-                    'last_seen': temporal_elem.find('last_seen').text
-                },
-                'classification': {
-                    'category': classification_elem.find('category').text,
-                    'directness': classification_elem.find('directness').text,
-                    'strength': classification_elem.find('strength').text
-                },
-                'provenance': {
-                    'source_context': provenance_elem.find('source_context').text,
-                    'extraction_method': provenance_elem.find('extraction_method').text
-                }
-            },
-            'properties': properties
-        })
-    
-    return {'concepts': concepts, 'relationships': relationships}
+def parse_response(content):
+    """Parse a response in the configured format into an ``Analysis``
 
-def chunk_iterator(file_obj, chunk_size=1000):
-    """Iterate over file in chunks"""
-    buffer = []
-    current_size = 0
-    
-    for line in file_obj:
-        buffer.append(line)
-        current_size += len(line)
-        
-        if current_size >= chunk_size:
-            yield ''.join(buffer)
-            buffer = []
-            current_size = 0
-    
-    if buffer:
-        yield ''.join(buffer)
-
-def get_context(current_context, window_size=5):
-    """Get enhanced rolling context window with metadata"""
-    context_entries = []
-    for entry in current_context[-window_size:]:
-        context_entries.append(f"{entry['name']} ({entry['type']}): {entry['description']}")
-        if entry.get('hierarchy', {}).get('parent'):
-            context_entries.append(f"Parent: {entry['hierarchy']['parent']}")
-    return '\n'.join(context_entries)
-
-def update_context(current_context, xml_result, max_size=15):
-    """Update rolling context with enhanced concept information"""
-    for concept in xml_result['concepts']:
-        # Only keep high-confidence concepts in context
-        if concept['confidence'] >= 0.7:
-            current_context.append({
-                'name': concept['name'],
-                'type': concept['type'],
-                'description': concept['description'],
-                'hierarchy': concept['hierarchy'],
-                'confidence': concept['confidence']
-            })
-    
-    # Maintain fixed context size, prioritizing high-confidence entries
-    if len(current_context) > max_size:
-        # Sort by confidence and keep top entries
-        current_context.sort(key=lambda x: x['confidence'], reverse=True)
-        current_context[:] = current_context[:max_size]
-
-def process_with_recovery(chunk, context, chunk_number, retries=3):
-    """Process chunk with retry mechanism"""
+    A response that fails validation is salvaged element by element when
+    ``salvage_responses`` is set; ValueError is raised only if nothing usable
+    is left, so the caller re-asks the model just for hopeless responses.
+    """
+    with metrics.time('parse'):
+        try:
+            result = response_format.parse(content, salvage=salvage_responses)
+        except ValueError as e:
+            logger.warning(f"Response validation failed: {e}")
+            metrics.inc('validation_failures')
+            raise
+    if result.salvaged:
+        logger.warning(
+            f"Salvaged {len(result.concepts)} concepts and {len(result.relationships)} relationships "
+            f"({result.repairs} fields repaired, {result.dropped} elements dropped)"
+        )
+        metrics.inc('validation_failures')
+        metrics.inc('salvaged_responses')
+        metrics.inc('salvage_repairs', result.repairs)
+        metrics.inc('salvage_dropped', result.dropped)
+    return result
+
+def stream_analyze_chunk(chunk, context, chunk_number, cache=None):
+    """Stream a chunk analysis, yielding ('concept', Concept) and ('relationship', Relationship)
+
+    The response is fed token by token into an lxml pull parser, and every
+    <concept> or <relationship> element is converted and yielded as soon as
+    its closing tag arrives.  Elements are validated individually against
+    their part of the schema, and repaired or dropped like a salvaged
+    response, because the document as a whole can only be validated once the
+    stream ends; the full response is validated then and cached only if it
+    passes.  If the stream restarts after a dropped connection, items of the
+    interrupted attempt may be yielded again.
+    """
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(MODEL_NAME, response_format.system_prompt, context, chunk)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            try:
+                result = parse_response(cached)
+            except ValueError:
+                cache.discard(cache_key)
+            else:
+                logger.info(f"Cache hit for chunk {chunk_number}")
+                metrics.inc('cache_hits')
+                for concept in result.concepts:
+                    yield 'concept', concept
+                for relationship in result.relationships:
+                    yield 'relationship', relationship
+                return
+        metrics.inc('cache_misses')
+
+    schemas = get_parser().element_schemas
+    converters = {'concept': element_to_concept, 'relationship': element_to_relationship}
+
+    def new_parser():
+        return ET.XMLPullParser(events=('end',), tag=('concept', 'relationship'),
+                                recover=salvage_responses)
+
+    def convert(element):
+        """Validate one element like ``AnalysisParser.salvage`` does, repairing it if allowed"""
+        if schemas[element.tag].validate(element):
+            item = converters[element.tag](element)
+            keyed = item.name if element.tag == 'concept' else item.source and item.target
+            if keyed and item.type:
+                return item
+        if not salvage_responses:
+            raise ValueError(f"Invalid <{element.tag}> element in streamed response")
+        item, repairs = salvage_element(element)
+        if item is None:
+            metrics.inc('salvage_dropped')
+            return None
+        metrics.inc('salvage_repairs', repairs)
+        return item
+
+    def drain():
+        for _, element in parser.read_events():
+            item = convert(element)
+            if item is not None:
+                yield element.tag, item
+
+    parser = new_parser()
+    parts = []
+    stream_start = time.perf_counter()
+    for delta in llm.stream(messages=build_messages(context, chunk)):
+        if delta is None:
+            # The connection dropped and the response starts over
+            parser = new_parser()
+            parts = []
+            continue
+        parts.append(delta)
+        with metrics.time('stream_feed'):
+            parser.feed(delta)
+        yield from drain()
+    parser.close()
+    yield from drain()
+    metrics.observe('llm_stream', time.perf_counter() - stream_start)
+
+    response_content = ''.join(parts)
+    logger.info("Successful response for chunk %s:\n%s", chunk_number, response_content,
+                extra=RESPONSE_LOG)
+    if cache is not None and validate_xml_response(response_content):
+        cache.put(cache_key, response_content)
+
+def get_context(current_context, chunk_text):
+    """Render the rolling context most relevant to ``chunk_text``"""
+    with metrics.time('get_context'):
+        return current_context.render(chunk_text)
+
+def update_context(current_context, concepts, relationships=()):
+    """Fold a chunk's concepts (and relationships) into the rolling context"""
+    with metrics.time('update_context'):
+        current_context.add(concepts)
+        if relationships:
+            current_context.observe_relationships(relationships)
+
+def process_with_recovery(chunk, context, chunk_number, retries=3, cache=None):
+    """Process chunk, re-asking the model when its response does not parse
+
+    Throttling, server errors and timeouts are retried with backoff inside
+    ``llm``; a malformed response says nothing about load, so it is
+    re-requested right away.
+    """
     for attempt in range(retries):
         try:
-            xml_result = analyze_chunk(chunk, context, chunk_number)
+            xml_result = analyze_chunk(chunk, context, chunk_number, cache=cache)
             return xml_result
-        except Exception as e:
+        except (ValueError, SyntaxError) as e:
             error_msg = f"Attempt {attempt + 1} failed for chunk {chunk_number}: {e}"
             logger.error(error_msg)
-            if attempt < retries - 1:
-                time.sleep(2 ** attempt)  # Exponential backoff
-            else:
+            if attempt == retries - 1:
                 raise
+            metrics.inc('parse_retries')
+
+def stream_document_chunk(chunk, context, chunk_number, cache=None, retries=3):
+    """Stream a ``Chunk``'s concepts and relationships with absolute positions
+
+    A stream that breaks off with a malformed element is re-requested.
+    Each concept name and (source, type, target) triple is yielded once per
+    chunk, so items a retried or restarted stream repeats are skipped: every
+    relationship write counts a sighting, and the repeat would count twice.
+    """
+    seen = set()
+    for attempt in range(retries):
+        try:
+            for kind, item in stream_analyze_chunk(chunk.text, context, chunk_number, cache=cache):
+                if kind == 'concept':
+                    resolve_source_positions([item], chunk)
+                    if resolver is not None:
+                        resolver.resolve_concept(item)
+                    key = (kind, item.name)
+                else:
+                    if resolver is not None:
+                        resolver.resolve_relationship(item)
+                    key = (kind, item.source, item.type, item.target)
+                if key in seen:
+                    metrics.inc('stream_duplicates_skipped')
+                    continue
+                seen.add(key)
+                yield kind, item
+            return
+        except (ValueError, SyntaxError) as e:
+            logger.error(f"Attempt {attempt + 1} failed for chunk {chunk_number}: {e}")
+            if attempt == retries - 1:
+                raise
+            metrics.inc('parse_retries')
+
+def analyze_document_chunk(chunk, context, chunk_number, cache=None):
+    """Analyze a ``Chunk``, anchor its source positions and canonicalize its names"""
+    xml_result = process_with_recovery(
+        chunk.text,
+        context,
+        chunk_number,
+        cache=cache
+    )
+    resolve_source_positions(xml_result.concepts, chunk)
+    if resolver is not None:
+        with metrics.time('resolve_entities'):
+            resolver.resolve_analysis(xml_result)
+    return xml_result
+
+def process_document(file_path, concurrency=1, ordering='strict', cache=None,
+                     manifest_path=None, resume=False, max_tokens=1000, overlap_tokens=0,
+                     neo4j=None, stream=False, context_tokens=300, graph_context=True,
+                     incremental=False, writer_options=None):
+    """Main document processing pipeline
+
+    With ``ordering='strict'`` chunks are analyzed one at a time and each
+    prompt sees the context left by the previous chunk.  With
+    ``ordering='throughput'`` up to ``concurrency`` chunks are analyzed in
+    parallel and each prompt sees the context from the latest completed
+    chunk instead.  When a ``ResponseCache`` is given, chunks whose prompt
+    was answered before are replayed from it instead of calling the API.
 
-def process_document(file_path):
-    """Main document processing pipeline"""
+    The document is split by ``chunker.iter_chunks`` into heading- and
+    paragraph-aligned chunks of about ``max_tokens`` tokens, optionally
+    repeating ``overlap_tokens`` of the previous chunk.  With ``stream=True``
+    (strict ordering and XML responses only) responses are streamed and
+    written element by element while the model is still generating.
+
+    Each prompt gets up to ``context_tokens`` tokens of rolling context,
+    favouring earlier concepts mentioned in the chunk and, with
+    ``graph_context``, their neighbors in the graph.
+
+    Progress is checkpointed to a run manifest after every chunk.  With
+    ``resume=True`` the run seeks to the first unfinished chunk of a previous
+    run, restores its rolling context and skips chunks already written.
+
+    With ``incremental=True`` the document is chunked at content-defined
+    boundaries and its chunks are diffed by content hash against the chunks
+    stored in the graph by earlier incremental runs:
+    only new or incompletely written chunks are analyzed, and the
+    contributions of chunks no longer in the document are retracted.
+
+    Writes go through a ``WriteBehindWriter`` configured by
+    ``writer_options``, which group-commits chunks on a background thread;
+    every queued write is flushed before this returns.
+
+    Returns a per-document status summary.  Pass ``neo4j`` to reuse an
+    existing connection instead of opening one for this document.
+    """
     start_time = datetime.now()
     logger.info(f"Started processing document: {file_path} at {start_time}")
     
-    neo4j = Neo4jConnection()
-    current_context = []
-    chunk_number = 0
+    manifest_path = manifest_path or default_manifest_path(file_path)
+    manifest = RunManifest.load(manifest_path, file_path) if resume else None
+    if manifest is not None:
+        first_chunk, offset, char_offset = manifest.resume_point()
+        saved_context = manifest.context
+        logger.info(f"Resuming at chunk {first_chunk} (byte offset {offset}) from {manifest_path}")
+    else:
+        if resume:
+            logger.info(f"No usable manifest at {manifest_path}, starting from the beginning")
+        manifest = RunManifest(manifest_path, file_path)
+        first_chunk, offset, char_offset = 1, 0, 0
+        saved_context = []
+
+    if neo4j is None:
+        neo4j = Neo4jConnection()
+    current_context = ContextStore(
+        saved_context,
+        token_budget=context_tokens,
+        neo4j=neo4j if graph_context else None
+    )
     
-    with open(file_path, 'r') as file:
-        for chunk_number, chunk in enumerate(chunk_iterator(file), 1):
-            try:
-                # Process chunk with context
-                context = get_context(current_context)
-                logger.info(f"Processing chunk {chunk_number} with context:\n{context}")
-                
-                xml_result = process_with_recovery(
-                    chunk,
-                    context,
-                    chunk_number
-                )
-                
-                # Update Neo4j
-                for concept in xml_result['concepts']:
-                    neo4j.create_concept_node(concept)
-                
-                for relationship in xml_result['relationships']:
-                    neo4j.create_relationship(relationship)
-                
-                # Update rolling context
-                update_context(current_context, xml_result)
-                
-                logger.info(f"Chunk {chunk_number} processed successfully")
-                
-                # Log rolling context
-                logger.info(f"Rolling context after chunk {chunk_number}:\n{json.dumps(current_context, indent=2)}")
-                
-            except Exception as e:
-                logger.error(f"Error processing chunk {chunk_number}: {e}")
-                continue
+    chunks = (
+        (chunk_number, chunk)
+        for chunk_number, chunk in enumerate(
+            iter_chunks(file_path, max_tokens, overlap_tokens, start=offset, start_char=char_offset,
+                        anchored=incremental),
+            first_chunk
+        )
+        if not manifest.is_done(chunk_number)
+    )
+    plan = None
+    if incremental:
+        document = document_id(file_path)
+        plan = IncrementalPlan(document, neo4j.fetch_document_chunks(document))
+        analyzed = {}
+        chunks = (
+            (chunk_number, analyzed.setdefault(chunk_number, chunk))
+            for chunk_number, chunk in plan.filter(chunks)
+        )
+
+    writer = WriteBehindWriter(neo4j, **(writer_options or {}))
+    try:
+        if ordering == 'throughput' and concurrency > 1:
+            if stream:
+                logger.info("Streaming applies to strict ordering only; pipelined mode uses full responses")
+            process_chunks_pipelined(writer, chunks, current_context, concurrency, cache, manifest)
+        elif stream and not response_format.streaming:
+            logger.info(f"The {response_format.name} response format cannot be streamed; using full responses")
+            process_chunks_serial(writer, chunks, current_context, cache, manifest)
+        elif stream:
+            process_chunks_streaming(writer, chunks, current_context, cache, manifest)
+        else:
+            process_chunks_serial(writer, chunks, current_context, cache, manifest)
+    finally:
+        writer.close()
+        if plan is not None:
+            # Checkpoint even an interrupted run so its written chunks are kept
+            neo4j.complete_chunks([
+                chunk.source_id for chunk_number, chunk in analyzed.items()
+                if manifest.is_done(chunk_number)
+            ])
+    if plan is not None:
+        removed = plan.removed()
+        if removed:
+            neo4j.retract_chunks(removed)
+        logger.info(f"Incremental update: {len(analyzed)} chunks analyzed, {plan.kept} unchanged, "
+                    f"{len(removed)} retracted")
 
     end_time = datetime.now()
     duration = end_time - start_time
     logger.info(f"Finished processing document at {end_time}. Total duration: {duration}")
+    counts = manifest.summary()
+    return {
+        'document': file_path,
+        'status': 'failed' if counts.get('failed') else 'done',
+        'chunks_done': counts.get('done', 0),
+        'chunks_failed': counts.get('failed', 0),
+        'duration': duration.total_seconds()
+    }
+
+def expand_corpus_paths(patterns, extensions=('.md', '.markdown', '.txt')):
+    """Expand files, directories and glob patterns into a sorted list of documents"""
+    paths = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True) or [pattern]
+        for match in matches:
+            if os.path.isdir(match):
+                for root, _, files in os.walk(match):
+                    for name in files:
+                        if name.lower().endswith(extensions):
+                            paths.add(os.path.join(root, name))
+            elif os.path.isfile(match):
+                paths.add(match)
+    return sorted(paths)
+
+# Per-worker state for corpus mode, set up once by init_corpus_worker
+_worker_neo4j = None
+_worker_cache = None
+
+def init_corpus_worker(limiter, max_concurrency, cache_options, salvage=True, format_name='xml',
+                       log_options=None, resolver_options=None, bulk_export_dir=None,
+                       similarity_options=None):
+    """Pool initializer: open one Neo4j driver, client and cache per worker
+
+    ``log_options`` carries the parent's log queue so worker records are
+    written by the parent's listener.  Each worker warms its own entity
+    resolver from the graph with ``resolver_options``.  With
+    ``bulk_export_dir`` the worker stages rows for a bulk import instead of
+    opening a driver.  ``similarity_options`` opens the similarity index.
+    """
+    global client, salvage_responses, response_format, _worker_neo4j, _worker_cache
+    if log_options is not None:
+        attach_worker_logging(**log_options)
+    salvage_responses = salvage
+    response_format = get_response_format(format_name)
+    client = create_client()
+    configure_llm(limiter, max_concurrency)
+    _worker_neo4j = BulkExporter(bulk_export_dir) if bulk_export_dir else Neo4jConnection()
+    configure_resolver(_worker_neo4j, **(resolver_options or {}))
+    configure_similarity(**(similarity_options or {}))
+    if cache_options is not None:
+        _worker_cache = ResponseCache(**cache_options)
+
+def process_corpus_document(file_path, options):
+    """Process one corpus document inside a worker and report its status
+
+    The worker's metrics are drained into the result so the parent process
+    can aggregate them.
+    """
+    try:
+        result = process_document(file_path, cache=_worker_cache, neo4j=_worker_neo4j, **options)
+        if isinstance(_worker_neo4j, Neo4jConnection):
+            result['neo4j_pool'] = _worker_neo4j.pool_health()
+    except Exception as e:
+        logger.error(f"Error processing document {file_path}: {e}")
+        metrics.inc('documents_failed')
+        result = {'document': file_path, 'status': 'error', 'error': str(e)}
+    result['metrics'] = metrics.snapshot(reset=True)
+    return result
+
+def process_corpus(patterns, workers=4, limiter=None, cache_options=None, salvage=True,
+                   format_name='xml', log_options=None, resolver_options=None, bulk_export_dir=None,
+                   similarity_options=None, **options):
+    """Process many documents in parallel across a process pool
+
+    Each document keeps its own rolling context and manifest.  Workers share
+    one ``RateLimiter`` budget and each reuses a single pooled Neo4j driver
+    for all the documents it handles.
+    """
+    paths = expand_corpus_paths(patterns)
+    logger.info(f"Processing corpus of {len(paths)} documents with {workers} workers")
+
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_corpus_worker,
+        initargs=(limiter, options.get('concurrency', 1), cache_options, salvage, format_name,
+                  log_options, resolver_options, bulk_export_dir, similarity_options)
+    ) as executor:
+        futures = {
+            executor.submit(process_corpus_document, path, options): path
+            for path in paths
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            metrics.merge(result.pop('metrics'))
+            results.append(result)
+            logger.info(f"Document status: {json.dumps(result)}")
+    return sorted(results, key=lambda result: result['document'])
+
+def write_bulk_export(import_dir):
+    """Merge the rows staged by every ``BulkExporter`` into the import CSVs"""
+    concepts, relationships = finalize_export(import_dir)
+    logger.info(f"Bulk export wrote {concepts} concepts and {relationships} relationships to {import_dir}; "
+                f"load them with 'python3 manage_neo4j.py import'")
+
+def chunk_written(chunk_number, chunk, manifest, context_snapshot, earlier_error=None):
+    """Completion callback for a chunk's last write: log, count and checkpoint it
+
+    ``earlier_error`` is a callable returning the error of a streamed
+    chunk's earlier partial writes, if any failed.
+    """
+    def on_done(error):
+        error = error or (earlier_error() if earlier_error else None)
+        if error is None:
+            logger.info(f"Chunk {chunk_number} processed successfully")
+            status = 'done'
+        else:
+            logger.error(f"Error writing chunk {chunk_number}: {error}")
+            status = 'failed'
+        metrics.inc(f'chunks_{status}')
+        if manifest is not None:
+            manifest.record(chunk_number, chunk, status, context_snapshot if error is None else None)
+    return on_done
+
+def process_chunks_serial(writer, chunks, current_context, cache=None, manifest=None):
+    """Analyze each chunk and fold it into the context strictly in order
+
+    Results are handed to the background ``WriteBehindWriter``, so the next
+    analysis starts while the previous chunk is still being written; each
+    chunk is checkpointed once its write committed.
+    """
+    for chunk_number, chunk in chunks:
+        try:
+            # Process chunk with context
+            context = get_context(current_context, chunk.text)
+            logger.info("Processing chunk %s with context:\n%s", chunk_number, context, extra=CONTEXT_LOG)
+            
+            xml_result = analyze_document_chunk(
+                chunk,
+                context,
+                chunk_number,
+                cache=cache
+            )
+            
+            # Update rolling context
+            update_context(current_context, xml_result.concepts, xml_result.relationships)
+            
+            # Queue the Neo4j write
+            writer.submit(
+                xml_result.concepts,
+                xml_result.relationships + propose_links(xml_result.concepts),
+                source=chunk.source_id,
+                on_done=chunk_written(chunk_number, chunk, manifest, current_context.to_list())
+            )
+            
+            # Log rolling context
+            logger.info("Rolling context after chunk %s:\n%s", chunk_number, JsonDump(current_context.to_list),
+                        extra=CONTEXT_LOG)
+            
+        except Exception as e:
+            logger.error(f"Error processing chunk {chunk_number}: {e}")
+            metrics.inc('chunks_failed')
+            if manifest is not None:
+                manifest.record(chunk_number, chunk, 'failed')
+            continue
+
+def process_chunks_streaming(writer, chunks, current_context, cache=None, manifest=None,
+                             flush_size=20):
+    """Like ``process_chunks_serial`` but writes items while the model is still generating
+
+    Concepts and relationships are queued for writing in groups of
+    ``flush_size`` as they stream in and folded into the rolling context
+    once the chunk is complete.  Pending concepts are always queued before
+    the first relationship so its endpoints are written first.
+    """
+    for chunk_number, chunk in chunks:
+        try:
+            context = get_context(current_context, chunk.text)
+            logger.info("Processing chunk %s with context:\n%s", chunk_number, context, extra=CONTEXT_LOG)
+
+            failures = []
+            concepts = []
+            relationships = []
+            streamed = {'concept': [], 'relationship': []}
+
+            def flush(concepts, relationships):
+                writer.submit(concepts, relationships, source=chunk.source_id,
+                              on_done=lambda error: error and failures.append(error))
+
+            for kind, item in stream_document_chunk(chunk, context, chunk_number, cache=cache):
+                streamed[kind].append(item)
+                if kind == 'concept':
+                    concepts.append(item)
+                    if len(concepts) >= flush_size:
+                        flush(concepts, [])
+                        concepts = []
+                else:
+                    if concepts:
+                        flush(concepts, [])
+                        concepts = []
+                    relationships.append(item)
+                    if len(relationships) >= flush_size:
+                        flush([], relationships)
+                        relationships = []
+            update_context(current_context, streamed['concept'], streamed['relationship'])
+            # The last write also completes the chunk, even if it is empty
+            writer.submit(
+                concepts,
+                relationships + propose_links(streamed['concept']),
+                source=chunk.source_id,
+                on_done=chunk_written(chunk_number, chunk, manifest, current_context.to_list(),
+                                      earlier_error=lambda failures=failures: failures[0] if failures else None)
+            )
+
+            logger.info("Rolling context after chunk %s:\n%s", chunk_number, JsonDump(current_context.to_list),
+                        extra=CONTEXT_LOG)
+
+        except Exception as e:
+            logger.error(f"Error processing chunk {chunk_number}: {e}")
+            metrics.inc('chunks_failed')
+            if manifest is not None:
+                manifest.record(chunk_number, chunk, 'failed')
+            continue
+
+def process_chunks_pipelined(writer, chunks, current_context, concurrency, cache=None, manifest=None):
+    """Keep ``concurrency`` analyses in flight while results are written in the background
+
+    The main thread submits chunks, folds completed results into the rolling
+    context and hands them to the background writer, so the API and Neo4j
+    are busy at the same time.  The writer's queue is bounded so a slow
+    database eventually throttles new submissions.
+    """
+    def collect(future):
+        chunk_number, chunk = pending.pop(future)
+        try:
+            xml_result = future.result()
+        except Exception as e:
+            logger.error(f"Error processing chunk {chunk_number}: {e}")
+            metrics.inc('chunks_failed')
+            if manifest is not None:
+                manifest.record(chunk_number, chunk, 'failed')
+            return
+        update_context(current_context, xml_result.concepts, xml_result.relationships)
+        logger.info("Rolling context after chunk %s:\n%s", chunk_number, JsonDump(current_context.to_list),
+                    extra=CONTEXT_LOG)
+        # The writer thread checkpoints this copy; the live list keeps changing
+        context_snapshot = current_context.to_list()
+        writer.submit(
+            xml_result.concepts,
+            xml_result.relationships + propose_links(xml_result.concepts),
+            source=chunk.source_id,
+            on_done=chunk_written(chunk_number, chunk, manifest, context_snapshot)
+        )
+
+    pending = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for chunk_number, chunk in chunks:
+            while len(pending) >= concurrency:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future)
+
+            context = get_context(current_context, chunk.text)
+            logger.info("Processing chunk %s with context:\n%s", chunk_number, context, extra=CONTEXT_LOG)
+            future = executor.submit(analyze_document_chunk, chunk, context, chunk_number, cache=cache)
+            pending[future] = (chunk_number, chunk)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                collect(future)
 
 if __name__ == "__main__":
-    import sys
-    
-    if len(sys.argv) != 2:
-        print("Usage: python process_document.py <file_path>")
-        sys.exit(1)
-    
-    process_document(sys.argv[1])
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Process documents into the knowledge graph")
+    parser.add_argument("paths", nargs="+",
+                        help="Document to process, or files, directories and glob patterns for corpus mode")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Worker processes in corpus mode (default: 4)")
+    parser.add_argument("--requests-per-minute", type=int,
+                        help="API request budget shared by all workers")
+    parser.add_argument("--tokens-per-minute", type=int,
+                        help="API token budget shared by all workers")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Number of chunk analyses kept in flight (default: 1)")
+    parser.add_argument("--ordering", choices=["strict", "throughput"], default="strict",
+                        help="strict: each chunk sees the previous chunk's context; "
+                             "throughput: context comes from the latest completed chunks")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream responses and write each element as soon as it is complete "
+                             "(strict ordering and XML format only)")
+    parser.add_argument("--format", choices=sorted(RESPONSE_FORMATS), default="xml",
+                        help="Response format requested from the model: xml (validated against "
+                             "schema.xsd) or json (compact rows, fewer output tokens)")
+    parser.add_argument("--cache-dir", default=".cache",
+                        help="Directory for the LLM response cache (default: .cache)")
+    parser.add_argument("--cache-max-mb", type=int, default=512,
+                        help="Size budget for the response cache in MB (default: 512)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Neither read nor write the response cache")
+    parser.add_argument("--refresh-cache", action="store_true",
+                        help="Ignore cached responses and overwrite them with fresh ones")
+    parser.add_argument("--max-tokens", type=int, default=1000,
+                        help="Approximate token budget per chunk (default: 1000)")
+    parser.add_argument("--overlap-tokens", type=int, default=0,
+                        help="Tokens of trailing context repeated from the previous chunk (default: 0)")
+    parser.add_argument("--context-tokens", type=int, default=300,
+                        help="Token budget for the rolling context in each prompt (default: 300)")
+    parser.add_argument("--no-graph-context", action="store_true",
+                        help="Do not add graph neighbors of mentioned concepts to the context")
+    parser.add_argument("--no-resolve", action="store_true",
+                        help="Write concept names as returned by the model, without entity resolution")
+    parser.add_argument("--resolve-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Minimum trigram similarity for merging two concept names "
+                             f"(default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--link-similar", action="store_true",
+                        help="Propose relationships between similar concepts across chunks and runs, "
+                             "using a persistent index (needs NumPy)")
+    parser.add_argument("--link-similar-dir", default="similarity", metavar="DIR",
+                        help="Directory of the similarity index (default: similarity)")
+    parser.add_argument("--similar-k", type=int, default=5,
+                        help="Most similar concepts linked per concept (default: 5)")
+    parser.add_argument("--similar-threshold", type=float, default=LINK_THRESHOLD,
+                        help=f"Minimum cosine similarity for a proposed link (default: {LINK_THRESHOLD})")
+    parser.add_argument("--write-queue", type=int, default=8,
+                        help="Chunk results waiting for the background Neo4j writer before analysis "
+                             "blocks (default: 8)")
+    parser.add_argument("--group-chunks", type=int, default=8,
+                        help="Most chunk results committed in one Neo4j transaction (default: 8)")
+    parser.add_argument("--group-rows", type=int, default=2000,
+                        help="Rows after which a group is committed without waiting for more (default: 2000)")
+    parser.add_argument("--flush-ms", type=int, default=200,
+                        help="Longest time the writer waits to fill a group (default: 200)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Re-analyze only chunks whose content changed since the last incremental run "
+                             "and retract the contributions of removed chunks")
+    parser.add_argument("--bulk-export", action="store_true",
+                        help="Write deduplicated concept and relationship CSVs for "
+                             "'manage_neo4j.py import' instead of writing to Neo4j")
+    parser.add_argument("--bulk-export-dir", default=DEFAULT_IMPORT_DIR, metavar="DIR",
+                        help="Directory for the bulk export (default: neo4j/import)")
+    parser.add_argument("--metrics-dir", default="metrics",
+                        help="Directory for the Prometheus text file and JSON run summary (default: metrics)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Also serve Prometheus metrics over HTTP on this port")
+    parser.add_argument("--manifest",
+                        help="Path of the run manifest (default: manifests/<document>.<hash>.json)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue from the first unfinished chunk recorded in the manifest")
+    parser.add_argument("--no-salvage", action="store_true",
+                        help="Re-request any response that fails validation instead of keeping its valid parts")
+    parser.add_argument("--log-dir", default="logs",
+                        help="Directory for the per-stream log files (default: logs)")
+    parser.add_argument("--log-level", default="INFO",
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="Minimum level logged (default: INFO)")
+    parser.add_argument("--payload-sample-rate", type=float, default=1.0,
+                        help="Fraction of full LLM responses and context dumps to log; 0 disables them "
+                             "(default: 1.0)")
+    parser.add_argument("--log-max-mb", type=int, default=50,
+                        help="Size at which a log file is rotated and gzip-compressed (default: 50)")
+    args = parser.parse_args()
+
+    corpus_mode = not (len(args.paths) == 1 and os.path.isfile(args.paths[0]))
+    if corpus_mode:
+        documents = expand_corpus_paths(args.paths)
+        if not documents:
+            parser.error(f"no documents found in: {' '.join(args.paths)}")
+    log_options = {
+        'level': args.log_level,
+        'payload_sample_rate': args.payload_sample_rate
+    }
+    # Corpus workers log through a process-safe queue to this process's listener
+    log_queue = multiprocessing.Queue() if corpus_mode else None
+    configure_logging(
+        args.log_dir,
+        max_bytes=args.log_max_mb * 1024 * 1024,
+        log_queue=log_queue,
+        **log_options
+    )
+    salvage_responses = not args.no_salvage
+    response_format = get_response_format(args.format)
+
+    cache_options = None
+    if not args.no_cache:
+        cache_options = {
+            'cache_dir': args.cache_dir,
+            'max_bytes': args.cache_max_mb * 1024 * 1024,
+            'refresh': args.refresh_cache
+        }
+    options = {
+        'concurrency': args.concurrency,
+        'ordering': args.ordering,
+        'resume': args.resume,
+        'max_tokens': args.max_tokens,
+        'overlap_tokens': args.overlap_tokens,
+        'stream': args.stream,
+        'context_tokens': args.context_tokens,
+        'graph_context': not args.no_graph_context,
+        'incremental': args.incremental,
+        'writer_options': {
+            'max_pending': args.write_queue,
+            'group_chunks': args.group_chunks,
+            'group_rows': args.group_rows,
+            'flush_interval': args.flush_ms / 1000
+        }
+    }
+    resolver_options = {
+        'enabled': not args.no_resolve,
+        'threshold': args.resolve_threshold
+    }
+    similarity_options = {
+        'path': args.link_similar_dir if args.link_similar else None,
+        'k': args.similar_k,
+        'threshold': args.similar_threshold
+    }
+    if args.link_similar and corpus_mode and args.workers > 1:
+        parser.error("--link-similar keeps one index file and needs a single document or --workers 1")
+    if args.incremental and (args.resume or args.bulk_export):
+        parser.error("--incremental cannot be combined with --resume or --bulk-export")
+    bulk_export_dir = args.bulk_export_dir if args.bulk_export else None
+    if args.bulk_export:
+        # Nothing is in the graph yet to fetch neighbors from
+        options['graph_context'] = False
+        if not args.resume:
+            clear_parts(bulk_export_dir)
+
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+
+    limiter = None
+    if args.requests_per_minute or args.tokens_per_minute:
+        limiter = RateLimiter(args.requests_per_minute, args.tokens_per_minute)
+
+    if not corpus_mode:
+        configure_llm(limiter, args.concurrency)
+        cache = ResponseCache(**cache_options) if cache_options else None
+        neo4j = BulkExporter(bulk_export_dir) if args.bulk_export else Neo4jConnection()
+        configure_resolver(neo4j, **resolver_options)
+        configure_similarity(**similarity_options)
+        try:
+            process_document(args.paths[0], cache=cache, manifest_path=args.manifest, neo4j=neo4j,
+                             **options)
+            if args.bulk_export:
+                neo4j.close()
+                write_bulk_export(bulk_export_dir)
+            else:
+                logger.info(f"Neo4j pool: {json.dumps(neo4j.pool_health())}")
+        finally:
+            if args.bulk_export:
+                neo4j.close()
+            if cache is not None:
+                logger.info(f"Response cache: {cache.hits} hits, {cache.misses} misses")
+                cache.close()
+            configure_similarity(None)
+            summary_path = metrics.write_files(args.metrics_dir)
+            logger.info(f"Metrics written to {summary_path}")
+    else:
+        if args.manifest:
+            parser.error("--manifest applies to a single document only")
+        results = process_corpus(
+            documents,
+            workers=args.workers,
+            limiter=limiter,
+            cache_options=cache_options,
+            salvage=salvage_responses,
+            format_name=response_format.name,
+            log_options=dict(log_options, log_queue=log_queue),
+            resolver_options=resolver_options,
+            bulk_export_dir=bulk_export_dir,
+            similarity_options=similarity_options,
+            **options
+        )
+        if args.bulk_export:
+            write_bulk_export(bulk_export_dir)
+        summary_path = metrics.write_files(args.metrics_dir)
+        logger.info(f"Metrics written to {summary_path}")
+        for result in results:
+            detail = result.get('error') or (
+                f"{result['chunks_done']} chunks done, {result['chunks_failed']} failed "
+                f"in {result['duration']:.1f}s"
+            )
+            print(f"{result['status']:>6}  {result['document']}: {detail}")
+        sys.exit(0 if all(result['status'] == 'done' for result in results) else 1)
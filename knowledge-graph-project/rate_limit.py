@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+import multiprocessing
+import threading
+import time
+
+
+class SharedTokenBucket:
+    """Token bucket whose state is shared by every process of a run.
+
+    The bucket refills at ``per_minute / 60`` units per second up to one
+    minute's worth.  Because the state lives in shared memory, an instance
+    handed to pool workers (e.g. through an initializer) throttles all of
+    them together.  ``debit`` may push the level below zero, which makes
+    later callers wait until the overdraft is repaid.
+    """
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, float(per_minute))
+        self._lock = multiprocessing.Lock()
+        self._level = multiprocessing.Value('d', self.capacity, lock=False)
+        self._updated = multiprocessing.Value('d', time.monotonic(), lock=False)
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated.value
+        self._level.value = min(self.capacity, self._level.value + elapsed * self.rate)
+        self._updated.value = now
+
+    def acquire(self, amount=1.0):
+        """Block until ``amount`` units are available, then take them"""
+        # A single request larger than the whole bucket may still proceed
+        # once the bucket is full, otherwise it would wait forever
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._level.value >= amount:
+                    self._level.value -= amount
+                    return
+                wait = (amount - self._level.value) / self.rate
+            time.sleep(wait)
+
+    def debit(self, amount):
+        """Take (or with a negative amount, return) units without waiting"""
+        with self._lock:
+            self._refill()
+            self._level.value = min(self.capacity, self._level.value - amount)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute budget for the LLM API.
+
+    Token cost is not known until the response arrives, so callers acquire
+    an estimate up front and report the real usage afterwards; the
+    difference is debited or refunded.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = SharedTokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = SharedTokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, estimated_tokens):
+        """Block until one request of about ``estimated_tokens`` may be sent"""
+        if self.requests is not None:
+            self.requests.acquire(1)
+        if self.tokens is not None:
+            self.tokens.acquire(estimated_tokens)
+
+    def record_usage(self, actual_tokens, estimated_tokens):
+        """Correct the token bucket with the usage reported by the API"""
+        if self.tokens is not None and actual_tokens is not None:
+            self.tokens.debit(actual_tokens - min(estimated_tokens, self.tokens.capacity))
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on the number of in-flight requests within one process.
+
+    Each success raises the limit by ``1 / limit`` (about one slot per
+    round of requests); a throttling signal halves it, at most once per
+    ``cooldown`` seconds so one burst of 429s counts as a single event.
+    """
+
+    def __init__(self, maximum, minimum=1, cooldown=5.0):
+        self.maximum = max(minimum, maximum)
+        self.minimum = minimum
+        self.cooldown = cooldown
+        self.limit = float(self.maximum)
+        self.in_flight = 0
+        self.throttle_events = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Block until a request slot is free"""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        """Free a request slot"""
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def on_success(self):
+        """Additively increase the limit"""
+        with self._condition:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    def on_throttle(self):
+        """Multiplicatively decrease the limit"""
+        with self._condition:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(self.minimum, self.limit / 2)
+                self._last_decrease = now
+                self.throttle_events += 1
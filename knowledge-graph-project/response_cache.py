@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for another process's write lock before giving up
+BUSY_TIMEOUT = 10.0
+
+# Hits whose last_access update is held back and written in one transaction
+TOUCH_BATCH = 64
+
+
+class ResponseCache:
+    """Persistent, content-addressed cache of raw LLM responses.
+
+    Entries are keyed by a hash of everything that determines the model's
+    answer (model name, system prompt, context and chunk text) and stored in a
+    single SQLite file under ``cache_dir``, which several processes may share.
+    When the stored responses exceed ``max_bytes`` the least recently used
+    entries are evicted.  Hits only record their access time in memory and
+    write it back in batches, with the next store or on ``close``.  The cache
+    is an optimization: a database error is logged and treated as a miss or
+    a skipped store instead of failing the chunk.
+    """
+
+    def __init__(self, cache_dir='.cache', max_bytes=512 * 1024 * 1024, refresh=False):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, 'responses.sqlite')
+        self.max_bytes = max_bytes
+        # In refresh mode lookups always miss, so every response is re-fetched
+        # and overwrites the stored one
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._touched = {}
+        self._db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+        )
+        self._db.commit()
+        self.total_bytes = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    @staticmethod
+    def make_key(model, system_prompt, context, chunk):
+        """Hash the inputs that determine a response"""
+        digest = hashlib.sha256()
+        for part in (model, system_prompt, context, chunk):
+            data = part.encode('utf-8')
+            # Length-prefix each part so field boundaries can't collide
+            digest.update(len(data).to_bytes(8, 'big'))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the cached response for ``key`` or None"""
+        if self.refresh:
+            self.misses += 1
+            return None
+        with self._lock:
+            try:
+                row = self._db.execute(
+                    "SELECT response FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    self._touched[key] = time.time()
+                    if len(self._touched) >= TOUCH_BATCH:
+                        self._flush_touched()
+                        self._db.commit()
+            except sqlite3.Error as e:
+                self._failed('read', e)
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response):
+        """Store ``response`` under ``key`` and evict old entries if over budget"""
+        size = len(response.encode('utf-8'))
+        with self._lock:
+            try:
+                self._flush_touched()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, size, last_access) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, response, size, time.time())
+                )
+                self._evict()
+                self._db.commit()
+            except sqlite3.Error as e:
+                self._failed('write', e)
+
+    def discard(self, key):
+        """Drop a single entry, e.g. one that no longer parses"""
+        with self._lock:
+            self._touched.pop(key, None)
+            try:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+            except sqlite3.Error as e:
+                self._failed('write', e)
+
+    def _failed(self, operation, error):
+        logger.warning(f"Response cache {operation} failed: {error}")
+        metrics.inc('cache_errors')
+        try:
+            self._db.rollback()
+        except sqlite3.Error:
+            pass
+
+    def _flush_touched(self):
+        """Write the access times of recent hits, in the caller's transaction"""
+        if self._touched:
+            self._db.executemany(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def _evict(self):
+        """Delete least recently used entries until at most 90% of the budget is used
+
+        Usage is recounted from the table, since other processes write to it too.
+        """
+        self.total_bytes = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        if self.total_bytes <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        rows = self._db.execute(
+            "SELECT key, size FROM responses ORDER BY last_access"
+        )
+        doomed = []
+        for key, size in rows:
+            if self.total_bytes <= target:
+                break
+            doomed.append((key,))
+            self.total_bytes -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def close(self):
+        """Write pending access times and close the underlying database"""
+        with self._lock:
+            try:
+                self._flush_touched()
+                self._db.commit()
+            except sqlite3.Error as e:
+                self._failed('write', e)
+            self._db.close()
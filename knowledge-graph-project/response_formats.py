@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+import json
+from datetime import datetime, timezone
+
+from analysis_parser import (
+    DEFAULT_PROPERTIES, SALVAGE_CONCEPT_TYPE, SALVAGE_CONFIDENCE, SALVAGE_EXTRACTION_METHOD,
+    SALVAGE_RELATIONSHIP_TYPE, Analysis, Concept, Relationship, ensure_integer_position, get_parser
+)
+
+
+XML_SYSTEM_PROMPT = """
+    Analyze technical documentation and return results in the following XML format:
+    <analysis>
+        <concepts>
+            <concept>
+                <name>concept_name</name>
+                <type>concept_type</type>
+                <description>description</description>
+                <confidence>0.95</confidence>
+                <source>
+                    <position>1234</position>
+                    <context>surrounding text for context</context>
+                </source>
+                <hierarchy>
+                    <parent>parent_concept</parent>
+                    <level>1</level>
+                </hierarchy>
+                <version>1</version>
+                <references>
+                    <reference>related_concept</reference>
+                </references>
+            </concept>
+        </concepts>
+        <relationships>
+            <relationship>
+                <source>source_concept</source>
+                <type>relationship_type</type>
+                <target>target_concept</target>
+                <metadata>
+                    <confidence>0.90</confidence>
+                    <bidirectional_strength>
+                        <forward>0.85</forward>
+                        <backward>0.75</backward>
+                    </bidirectional_strength>
+                    <temporal>
+                        <first_seen>2024-01-26T13:45:00Z</first_seen>
+                        <last_seen>2024-01-26T13:45:00Z</last_seen>
+                    </temporal>
+                    <classification>
+                        <category>dependency</category>
+                        <directness>direct</directness>
+                        <strength>strong</strength>
+                    </classification>
+                    <provenance>
+                        <source_context>contextual information</source_context>
+                        <extraction_method>deepseek_analysis</extraction_method>
+                    </provenance>
+                </metadata>
+                <properties>
+                    <property name="additional_info">value</property>
+                </properties>
+            </relationship>
+        </relationships>
+    </analysis>
+
+    Guidelines for analysis:
+    1. Assign confidence scores based on clarity and context
+    2. Use hierarchical classification for concepts
+    3. Track relationship directionality and strength
+    4. Provide detailed context for provenance
+    5. Classify relationships by type and directness
+    6. Report source position as the character offset of the concept's first mention within the chunk
+    """
+
+
+COMPACT_SYSTEM_PROMPT = """
+    Analyze technical documentation and return a single JSON object of positional arrays:
+    {"concepts": [[name, type, description, confidence, position, parent, level, [references]]],
+     "relationships": [[source, type, target, confidence, forward, backward, category, directness, strength]]}
+
+    Field notes:
+    - confidence, forward and backward are numbers between 0 and 1
+    - position is the character offset of the concept's first mention within the chunk
+    - parent is the parent concept name or null; level is an integer hierarchy depth
+    - category classifies the relationship (e.g. dependency), directness is direct or indirect,
+      strength is weak, moderate or strong
+
+    Guidelines for analysis:
+    1. Assign confidence scores based on clarity and context
+    2. Use hierarchical classification for concepts
+    3. Track relationship directionality and strength
+    4. Classify relationships by type and directness
+    5. Output only the JSON object, without commentary
+    """
+
+# Field order of the compact rows; also used to read rows the model sent as objects
+CONCEPT_FIELDS = ('name', 'type', 'description', 'confidence', 'position', 'parent', 'level',
+                  'references')
+RELATIONSHIP_FIELDS = ('source', 'type', 'target', 'confidence', 'forward', 'backward',
+                       'category', 'directness', 'strength')
+
+
+class XmlFormat:
+    """The original verbose XML format, validated against ``schema.xsd``"""
+    name = 'xml'
+    system_prompt = XML_SYSTEM_PROMPT
+    request_options = {}
+    streaming = True
+
+    def parse(self, content, salvage=True):
+        """Return an ``Analysis``, salvaging valid elements if the document is invalid"""
+        parser = get_parser()
+        try:
+            return parser.parse(content)
+        except ValueError as error:
+            if not salvage:
+                raise
+            result = parser.salvage(content)
+            if not result.concepts and not result.relationships:
+                raise error
+            return result
+
+
+class _RowReader:
+    """Coerces one compact row, counting every value it had to repair"""
+
+    def __init__(self, row, fields):
+        if isinstance(row, dict):
+            row = [row.get(name) for name in fields]
+        if not isinstance(row, list):
+            raise ValueError(f"Expected a list row, got {type(row).__name__}")
+        self.row = row
+        self.repairs = 0
+
+    def text(self, index, default=None):
+        value = self.row[index] if index < len(self.row) else None
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        if isinstance(value, str) and value.strip():
+            return value.strip()
+        if default is not None:
+            self.repairs += 1
+        return default
+
+    def unit(self, index, default):
+        value = self.row[index] if index < len(self.row) else None
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            self.repairs += 1
+            return default
+        if not 0.0 <= number <= 1.0:
+            self.repairs += 1
+        return min(1.0, max(0.0, number))
+
+    def integer(self, index, default):
+        value = ensure_integer_position(self.row[index] if index < len(self.row) else None)
+        if value is None:
+            self.repairs += 1
+            return default
+        return value
+
+    def names(self, index):
+        value = self.row[index] if index < len(self.row) else None
+        if not isinstance(value, list):
+            return []
+        return [str(item).strip() for item in value if item is not None and str(item).strip()]
+
+
+class CompactJsonFormat:
+    """Positional JSON rows requested through the API's JSON mode
+
+    Each concept and relationship is one short array instead of a tree of
+    about twenty tags.  Fields that never vary per response -- version,
+    extraction method, timestamps and placeholder properties -- are not
+    requested at all and are filled in here; a concept's source context is
+    cut from the chunk when positions are resolved.
+    """
+    name = 'json'
+    system_prompt = COMPACT_SYSTEM_PROMPT
+    request_options = {'response_format': {'type': 'json_object'}}
+    streaming = False
+
+    def parse(self, content, salvage=True):
+        """Return an ``Analysis``; ValueError if the JSON is unusable
+
+        Without ``salvage`` any row that needed a repair fails the response.
+        """
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON response: {e}") from e
+        if not isinstance(data, dict):
+            raise ValueError("Invalid JSON response: expected an object")
+
+        seen = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        result = Analysis([], [])
+        for row in data.get('concepts') or []:
+            self._add(result, result.concepts, self._concept, row, CONCEPT_FIELDS)
+        for row in data.get('relationships') or []:
+            self._add(result, result.relationships, self._relationship, row, RELATIONSHIP_FIELDS,
+                      seen)
+
+        if result.repairs or result.dropped:
+            if not salvage or (not result.concepts and not result.relationships):
+                raise ValueError(
+                    f"Invalid JSON response: {result.dropped} rows unusable, "
+                    f"{result.repairs} fields invalid"
+                )
+            result.salvaged = True
+        return result
+
+    @staticmethod
+    def _add(result, records, convert, row, fields, *args):
+        try:
+            reader = _RowReader(row, fields)
+            record = convert(reader, *args)
+        except ValueError:
+            record = None
+        if record is None:
+            result.dropped += 1
+            return
+        result.repairs += reader.repairs
+        records.append(record)
+
+    @staticmethod
+    def _concept(reader):
+        name = reader.text(0)
+        if name is None:
+            return None
+        return Concept(
+            name=name,
+            type=reader.text(1, SALVAGE_CONCEPT_TYPE),
+            description=reader.text(2, ''),
+            confidence=reader.unit(3, SALVAGE_CONFIDENCE),
+            source_position=ensure_integer_position(reader.row[4] if len(reader.row) > 4 else None),
+            hierarchy_parent=reader.text(5),
+            hierarchy_level=reader.integer(6, 0),
+            references=reader.names(7)
+        )
+
+    @staticmethod
+    def _relationship(reader, seen):
+        source = reader.text(0)
+        target = reader.text(2)
+        if source is None or target is None:
+            return None
+        confidence = reader.unit(3, SALVAGE_CONFIDENCE)
+        return Relationship(
+            source=source,
+            type=reader.text(1, SALVAGE_RELATIONSHIP_TYPE),
+            target=target,
+            confidence=confidence,
+            forward_strength=reader.unit(4, confidence),
+            backward_strength=reader.unit(5, confidence),
+            first_seen=seen,
+            last_seen=seen,
+            category=reader.text(6),
+            directness=reader.text(7),
+            strength=reader.text(8),
+            extraction_method=SALVAGE_EXTRACTION_METHOD,
+            properties=dict(DEFAULT_PROPERTIES)
+        )
+
+
+RESPONSE_FORMATS = {
+    XmlFormat.name: XmlFormat(),
+    CompactJsonFormat.name: CompactJsonFormat()
+}
+
+
+def get_response_format(name):
+    """Look up a response format by its ``--format`` name"""
+    try:
+        return RESPONSE_FORMATS[name]
+    except KeyError:
+        raise ValueError(f"Unknown response format {name!r}, expected one of {sorted(RESPONSE_FORMATS)}")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+
+def default_manifest_path(document_path, manifest_dir='manifests'):
+    """Derive a stable manifest location for a document"""
+    absolute = os.path.abspath(document_path)
+    digest = hashlib.sha1(absolute.encode('utf-8')).hexdigest()[:12]
+    name = os.path.basename(absolute)
+    return os.path.join(manifest_dir, f"{name}.{digest}.json")
+
+
+class RunManifest:
+    """Checkpoint of a document ingestion run.
+
+    Records, per chunk, the byte range it was read from and its status
+    ('done' or 'failed'), together with the rolling context after the most
+    recently finished chunk.  The file is rewritten atomically after every
+    chunk so a crash never leaves a half-written manifest behind.
+    """
+
+    def __init__(self, path, document_path):
+        self.path = path
+        self._lock = threading.Lock()
+        stat = os.stat(document_path)
+        self.data = {
+            'document': os.path.abspath(document_path),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'started_at': datetime.now().isoformat(),
+            'updated_at': None,
+            'context': [],
+            'chunks': {}
+        }
+
+    @classmethod
+    def load(cls, path, document_path):
+        """Load an existing manifest, or return None if it is missing or stale"""
+        if not os.path.exists(path):
+            return None
+        manifest = cls(path, document_path)
+        with open(path, 'r') as f:
+            data = json.load(f)
+        # A document that changed since the checkpoint can't be resumed safely
+        if data.get('size') != manifest.data['size'] or data.get('mtime') != manifest.data['mtime']:
+            return None
+        manifest.data = data
+        return manifest
+
+    def record(self, chunk_number, chunk, status, context=None):
+        """Record a chunk's outcome and persist the manifest"""
+        with self._lock:
+            self.data['chunks'][str(chunk_number)] = {
+                'start': chunk.start,
+                'end': chunk.end,
+                'start_char': chunk.start_char,
+                'end_char': chunk.end_char,
+                'status': status
+            }
+            if context is not None:
+                self.data['context'] = context
+            self.data['updated_at'] = datetime.now().isoformat()
+            self._save()
+
+    def is_done(self, chunk_number):
+        """Whether a chunk was already written in a previous run"""
+        entry = self.data['chunks'].get(str(chunk_number))
+        return entry is not None and entry['status'] == 'done'
+
+    def resume_point(self):
+        """Return (chunk_number, byte_offset, char_offset) of the first unfinished chunk
+
+        Offsets point at the end of the last finished chunk, which is where
+        the unfinished chunk's new content begins even when chunks overlap.
+        """
+        chunk_number = 1
+        offset = char_offset = 0
+        while True:
+            entry = self.data['chunks'].get(str(chunk_number))
+            if entry is None or entry['status'] != 'done':
+                return chunk_number, offset, char_offset
+            offset = entry['end']
+            char_offset = entry['end_char']
+            chunk_number += 1
+
+    def summary(self):
+        """Count chunks by status"""
+        counts = {}
+        for entry in self.data['chunks'].values():
+            counts[entry['status']] = counts.get(entry['status'], 0) + 1
+        return counts
+
+    @property
+    def context(self):
+        """Rolling context saved with the latest finished chunk"""
+        return self.data['context']
+
+    def _save(self):
+        """Write to a temporary file and atomically replace the manifest"""
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.manifest-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+import json
+import os
+import re
+import threading
+import zlib
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+except ImportError:  # optional: only needed with --link-similar
+    np = None
+
+from analysis_parser import Relationship
+from metrics import metrics
+
+DEFAULT_DIMENSIONS = 4096
+
+# Names say more about what a concept is than their descriptions do
+NAME_WEIGHT = 2.0
+
+# Cosine similarity above which two concepts are proposed as related, and
+# above which they are flagged as probable duplicates instead
+LINK_THRESHOLD = 0.55
+DUPLICATE_THRESHOLD = 0.92
+
+EXTRACTION_METHOD = 'similarity_index'
+
+# Index rows scored per matrix product, bounding memory for large indexes
+BLOCK_ROWS = 65536
+
+WORD_PATTERN = re.compile(r'[^\W_]+')
+
+
+def _features(text):
+    """Character trigrams of each word plus the words themselves"""
+    features = []
+    for word in WORD_PATTERN.findall(text.casefold()):
+        features.append(f'w:{word}')
+        padded = f' {word} '
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+
+class SimilarityIndex:
+    """Hashed character n-gram vectors of concept names and descriptions.
+
+    Each concept becomes one L2-normalized row of a float32 matrix held in a
+    memory-mapped file under ``path``, with the concept names in an
+    append-only sidecar, so the index grows as chunks arrive and survives
+    across runs.  ``top_k`` scores a batch of queries with one matrix
+    product per block of rows.  Re-adding a name overwrites its row.
+    """
+
+    def __init__(self, path, dimensions=DEFAULT_DIMENSIONS, capacity=1024):
+        if np is None:
+            raise RuntimeError("The similarity index needs NumPy: pip install numpy")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            dimensions, capacity = meta['dimensions'], meta['capacity']
+        self.dimensions = dimensions
+        self.capacity = 0
+        self._matrix = None
+        self._resize(capacity)
+
+        self.names = []
+        names_path = os.path.join(path, 'names.jsonl')
+        if os.path.exists(names_path):
+            complete = 0
+            with open(names_path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        self.names.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break
+                    complete += len(line)
+            # A crash mid-append leaves a torn last line: cut it off so the next
+            # name starts on a fresh line, and its row is reused for that name
+            if complete < os.path.getsize(names_path):
+                os.truncate(names_path, complete)
+        self._rows = {name: row for row, name in enumerate(self.names)}
+        self._names_file = open(names_path, 'a', encoding='utf-8')
+
+    def __len__(self):
+        return len(self.names)
+
+    def _resize(self, capacity):
+        vectors_path = os.path.join(self.path, 'vectors.f32')
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(vectors_path, 'ab') as f:
+            f.truncate(max(os.path.getsize(vectors_path), capacity * self.dimensions * 4))
+        self._matrix = np.memmap(vectors_path, dtype=np.float32, mode='r+',
+                                 shape=(capacity, self.dimensions))
+        self.capacity = capacity
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump({'dimensions': self.dimensions, 'capacity': capacity}, f)
+
+    def _hash(self, text):
+        buckets = [zlib.crc32(feature.encode('utf-8')) % self.dimensions for feature in _features(text)]
+        vector = np.bincount(buckets, minlength=self.dimensions).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def vectorize(self, concepts):
+        """Matrix of one normalized row per concept"""
+        vectors = np.empty((len(concepts), self.dimensions), dtype=np.float32)
+        for row, concept in enumerate(concepts):
+            vector = NAME_WEIGHT * self._hash(concept.name) + self._hash(concept.description or '')
+            norm = np.linalg.norm(vector)
+            vectors[row] = vector / norm if norm else vector
+        return vectors
+
+    def add(self, concepts, vectors=None):
+        """Insert or overwrite the rows of ``concepts`` and persist them"""
+        if not concepts:
+            return
+        vectors = self.vectorize(concepts) if vectors is None else vectors
+        with self._lock:
+            new_names = []
+            for concept, vector in zip(concepts, vectors):
+                row = self._rows.get(concept.name)
+                if row is None:
+                    row = len(self.names) + len(new_names)
+                    if row >= self.capacity:
+                        self._resize(max(self.capacity * 2, row + 1))
+                    self._rows[concept.name] = row
+                    new_names.append(concept.name)
+                self._matrix[row] = vector
+            # Vectors reach the file before the names that make them visible
+            self._matrix.flush()
+            self.names.extend(new_names)
+            self._names_file.writelines(json.dumps(name) + '\n' for name in new_names)
+            self._names_file.flush()
+
+    def top_k(self, vectors, k=5):
+        """Return ``(rows, scores)``, each of shape (queries, k), best first"""
+        with self._lock:
+            count = len(self.names)
+            k = min(k, count)
+            if k == 0:
+                empty = np.empty((len(vectors), 0))
+                return empty.astype(np.int64), empty.astype(np.float32)
+            best_rows = np.empty((len(vectors), 0), dtype=np.int64)
+            best_scores = np.empty((len(vectors), 0), dtype=np.float32)
+            for start in range(0, count, BLOCK_ROWS):
+                block = self._matrix[start:min(count, start + BLOCK_ROWS)]
+                scores = np.concatenate([best_scores, vectors @ block.T], axis=1)
+                rows = np.concatenate([
+                    best_rows,
+                    np.broadcast_to(np.arange(start, start + len(block)), (len(vectors), len(block)))
+                ], axis=1)
+                keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(scores, keep, axis=1)
+                best_rows = np.take_along_axis(rows, keep, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def link(self, concepts, k=5, threshold=LINK_THRESHOLD, duplicate_threshold=DUPLICATE_THRESHOLD):
+        """Propose relationships from ``concepts`` to similar indexed concepts, then index them
+
+        Concepts of the same batch are skipped as candidates; they share a
+        chunk, so the model already had the chance to relate them.  Pairs
+        above ``duplicate_threshold`` are proposed as ``possible_duplicate_of``
+        for review instead of ``similar_to``.
+        """
+        if not concepts:
+            return []
+        vectors = self.vectorize(concepts)
+        rows, scores = self.top_k(vectors, k + len(concepts))
+        batch = {concept.name for concept in concepts}
+        now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        proposals = []
+        for concept, candidate_rows, candidate_scores in zip(concepts, rows, scores):
+            found = 0
+            for row, score in zip(candidate_rows, candidate_scores):
+                if found == k or score < threshold:
+                    break
+                target = self.names[row]
+                if target in batch:
+                    continue
+                found += 1
+                duplicate = score >= duplicate_threshold
+                proposals.append(Relationship(
+                    source=concept.name,
+                    type='possible_duplicate_of' if duplicate else 'similar_to',
+                    target=target,
+                    confidence=round(float(score), 4),
+                    forward_strength=round(float(score), 4),
+                    backward_strength=round(float(score), 4),
+                    first_seen=now,
+                    last_seen=now,
+                    category='similarity',
+                    directness='indirect',
+                    strength='strong' if score >= 0.8 else 'moderate',
+                    source_context='Proposed by name and description similarity',
+                    extraction_method=EXTRACTION_METHOD
+                ))
+                metrics.inc('similarity_duplicates' if duplicate else 'similarity_links')
+        self.add(concepts, vectors)
+        return proposals
+
+    def close(self):
+        with self._lock:
+            self._matrix.flush()
+            self._names_file.close()
@@ -1,61 +1,201 @@
 #!/usr/bin/env python3
 from neo4j import GraphDatabase
 from dotenv import load_dotenv
+import json
 import os
+import sys
 
 # Load environment variables
 load_dotenv()
 
-def verify_processing():
+# Every summary query aggregates on the server and returns a handful of rows
+SUMMARY_QUERIES = {
+    'concepts_by_type': """
+        MATCH (c:Concept)
+        RETURN c.type AS type, count(*) AS count
+        ORDER BY count DESC
+    """,
+    'relationships_by_type': """
+        MATCH ()-[r:RELATES_TO]->()
+        RETURN r.type AS type, r.category AS category, count(*) AS count
+        ORDER BY count DESC
+    """,
+    'degree': """
+        MATCH (c:Concept)
+        WITH COUNT { (c)-[:RELATES_TO]-() } AS degree
+        RETURN count(*) AS concepts,
+               sum(CASE WHEN degree = 0 THEN 1 ELSE 0 END) AS isolated,
+               min(degree) AS min, max(degree) AS max, avg(degree) AS mean,
+               percentileDisc(degree, 0.5) AS p50,
+               percentileDisc(degree, 0.9) AS p90,
+               percentileDisc(degree, 0.99) AS p99
+    """,
+    # Endpoints that only exist because something referred to them: stub
+    # nodes without a type, and hierarchy parents that were never extracted
+    'orphans': """
+        CALL {
+            MATCH (c:Concept)-[r:RELATES_TO]-()
+            WHERE c.type IS NULL
+            RETURN count(DISTINCT r) AS stub_relationships, count(DISTINCT c) AS stub_concepts
+        }
+        CALL {
+            MATCH (c:Concept)
+            WHERE c.hierarchy_parent IS NOT NULL
+              AND NOT EXISTS { MATCH (:Concept {name: c.hierarchy_parent}) }
+            RETURN count(c) AS dangling_parents
+        }
+        RETURN stub_relationships, stub_concepts, dangling_parents
+    """,
+    'hierarchy_levels': """
+        MATCH (c:Concept)
+        RETURN coalesce(c.hierarchy_level, 0) AS level, count(*) AS count
+        ORDER BY level
+    """,
+    # Depth of each leaf below its root along materialized CHILD_OF edges
+    'hierarchy_depth': """
+        MATCH (leaf:Concept)-[:CHILD_OF]->()
+        WHERE NOT EXISTS { ()-[:CHILD_OF]->(leaf) }
+        MATCH path = (leaf)-[:CHILD_OF*1..10]->(root:Concept)
+        WHERE NOT EXISTS { (root)-[:CHILD_OF]->() }
+        WITH leaf, max(length(path)) AS depth
+        RETURN count(leaf) AS leaves, max(depth) AS max, avg(depth) AS mean
+    """,
+}
+
+# Keyset pagination over the Concept.name uniqueness index: each page starts
+# after the last name of the previous one, so no page ever skips rows.
+# Outgoing relationships travel with their source concept.
+EXPORT_PAGE_QUERY = """
+MATCH (c:Concept)
+WHERE c.name > $after
+WITH c
+ORDER BY c.name
+LIMIT $page_size
+OPTIONAL MATCH (c)-[r:RELATES_TO]->(target:Concept)
+RETURN c.name AS name,
+       properties(c) AS concept,
+       collect(CASE WHEN r IS NULL THEN null
+               ELSE {target: target.name, properties: properties(r)} END) AS relationships
+ORDER BY name
+"""
+
+def create_driver():
     uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
     user = os.getenv("NEO4J_USER", "neo4j")
     password = os.getenv("NEO4J_PASSWORD")
-    
-    try:
-        driver = GraphDatabase.driver(uri, auth=(user, password))
-        with driver.session() as session:
-            # Query all concepts
-            print("\n=== Concepts ===")
-            concepts_query = """
-            MATCH (c:Concept)
-            RETURN c
-            """
-            result = session.run(concepts_query)
-            for record in result:
-                concept = record['c']
-                print("\nConcept:")
-                for key, value in concept.items():
-                    print(f"{key}: {value}")
-
-            # Query all relationships
-            print("\n=== Relationships ===")
-            relationships_query = """
-            MATCH (c1:Concept)-[r:RELATES_TO]->(c2:Concept)
-            RETURN c1.name as source, type(r) as type, r as relationship, c2.name as target
-            """
-            result = session.run(relationships_query)
-            for record in result:
-                print(f"\nRelationship from {record['source']} to {record['target']}:")
-                for key, value in record['relationship'].items():
-                    print(f"{key}: {value}")
-
-            # Query hierarchical structure
-            print("\n=== Hierarchy ===")
-            hierarchy_query = """
-            MATCH (c:Concept)
-            WHERE c.hierarchy_parent IS NOT NULL
-            RETURN c.name as concept, c.hierarchy_parent as parent, c.hierarchy_level as level
-            ORDER BY c.hierarchy_level
-            """
-            result = session.run(hierarchy_query)
-            for record in result:
-                print(f"Concept: {record['concept']}, Parent: {record['parent']}, Level: {record['level']}")
+    return GraphDatabase.driver(uri, auth=(user, password))
+
+def collect_summary(driver):
+    """Run the aggregate queries in one read transaction"""
+    def work(tx):
+        return {name: tx.run(query).data() for name, query in SUMMARY_QUERIES.items()}
+
+    with driver.session() as session:
+        summary = session.execute_read(work)
+    for name in ('degree', 'orphans', 'hierarchy_depth'):
+        summary[name] = summary[name][0]
+    return summary
+
+def print_summary(summary):
+    degree = summary['degree']
+    print(f"\n=== Concepts ({degree['concepts']}) ===")
+    for row in summary['concepts_by_type']:
+        print(f"{row['count']:>10}  {row['type']}")
+
+    print(f"\n=== Relationships ({sum(row['count'] for row in summary['relationships_by_type'])}) ===")
+    for row in summary['relationships_by_type']:
+        print(f"{row['count']:>10}  {row['type']} ({row['category']})")
+
+    print("\n=== Degree ===")
+    if degree['concepts']:
+        print(f"min {degree['min']}, p50 {degree['p50']}, p90 {degree['p90']}, p99 {degree['p99']}, "
+              f"max {degree['max']}, mean {degree['mean']:.2f}")
+    print(f"Isolated concepts: {degree['isolated']}")
 
+    orphans = summary['orphans']
+    print("\n=== Orphans ===")
+    print(f"Relationships touching stub concepts: {orphans['stub_relationships']} "
+          f"({orphans['stub_concepts']} stub concepts)")
+    print(f"Concepts whose hierarchy parent does not exist: {orphans['dangling_parents']}")
+
+    print("\n=== Hierarchy ===")
+    for row in summary['hierarchy_levels']:
+        print(f"Level {row['level']}: {row['count']} concepts")
+    depth = summary['hierarchy_depth']
+    if depth['leaves']:
+        print(f"CHILD_OF depth over {depth['leaves']} leaves: max {depth['max']}, mean {depth['mean']:.2f}")
+
+def export_ndjson(driver, out, page_size=1000):
+    """Stream every concept and its outgoing relationships to ``out`` as NDJSON
+
+    Only one page of ``page_size`` concepts is held in memory at a time.
+    Returns ``(concepts, relationships)`` written.
+    """
+    def page(tx, after):
+        return tx.run(EXPORT_PAGE_QUERY, after=after, page_size=page_size).data()
+
+    concepts = relationships = 0
+    after = ''
+    with driver.session() as session:
+        while True:
+            rows = session.execute_read(page, after)
+            for row in rows:
+                out.write(json.dumps(dict(row['concept'], kind='concept'), default=str) + '\n')
+                for rel in row['relationships']:
+                    record = dict(rel['properties'], kind='relationship',
+                                  source=row['name'], target=rel['target'])
+                    out.write(json.dumps(record, default=str) + '\n')
+                relationships += len(row['relationships'])
+            concepts += len(rows)
+            if len(rows) < page_size:
+                return concepts, relationships
+            after = rows[-1]['name']
+
+def verify_processing(as_json=False):
+    """Print a server-side summary of the graph"""
+    try:
+        driver = create_driver()
+        summary = collect_summary(driver)
         driver.close()
-        return True
     except Exception as e:
         print(f"Verification failed: {e}")
         return False
+    if as_json:
+        print(json.dumps(summary, indent=2, default=str))
+    else:
+        print_summary(summary)
+    return True
+
+def export_graph(path, page_size=1000):
+    """Dump the graph to ``path`` ('-' for stdout) as NDJSON"""
+    try:
+        driver = create_driver()
+        if path == '-':
+            counts = export_ndjson(driver, sys.stdout, page_size)
+        else:
+            with open(path, 'w', encoding='utf-8') as out:
+                counts = export_ndjson(driver, out, page_size)
+        driver.close()
+    except Exception as e:
+        print(f"Export failed: {e}", file=sys.stderr)
+        return False
+    print(f"Exported {counts[0]} concepts and {counts[1]} relationships", file=sys.stderr)
+    return True
 
 if __name__ == "__main__":
-    verify_processing()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Verify or export the knowledge graph")
+    parser.add_argument("--json", action="store_true",
+                        help="Print the summary as JSON")
+    parser.add_argument("--export", metavar="PATH",
+                        help="Stream every concept and relationship to PATH as NDJSON ('-' for stdout)")
+    parser.add_argument("--page-size", type=int, default=1000,
+                        help="Concepts fetched per page when exporting (default: 1000)")
+    args = parser.parse_args()
+
+    if args.export:
+        success = export_graph(args.export, args.page_size)
+    else:
+        success = verify_processing(args.json)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class WriteJob:
+    """One chunk's (or one streamed batch's) rows waiting to be written"""
+    concepts: list
+    relationships: list
+    source: str = None
+    on_done: object = None
+
+    @property
+    def rows(self):
+        return len(self.concepts) + len(self.relationships)
+
+
+class WriteBehindWriter:
+    """Background Neo4j writer that group-commits queued chunk results.
+
+    ``submit`` puts a job on a queue of at most ``max_pending`` jobs and
+    blocks while it is full, so a slow database throttles the producers
+    instead of buffering without bound.  The writer thread takes the first
+    waiting job and keeps collecting more for up to ``flush_interval``
+    seconds, or until it has ``group_chunks`` jobs or ``group_rows`` rows, and
+    writes them in one transaction.  If a group fails, its jobs are retried
+    one by one so a single bad chunk doesn't fail its neighbours.
+
+    Each job's ``on_done(error)`` is called on the writer thread with None
+    after its transaction committed, or with the exception that failed it.
+    ``close`` writes everything still queued and returns the number of jobs
+    that failed.
+    """
+
+    def __init__(self, neo4j, max_pending=8, group_chunks=8, group_rows=2000, flush_interval=0.2):
+        self.neo4j = neo4j
+        self.group_chunks = group_chunks
+        self.group_rows = group_rows
+        self.flush_interval = flush_interval
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="neo4j-writer", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, concepts, relationships, source=None, on_done=None):
+        """Queue rows for writing, waiting while the queue is full"""
+        if self._closed:
+            raise RuntimeError("writer is closed")
+        with metrics.time('write_queue_wait'):
+            self._queue.put(WriteJob(list(concepts), list(relationships), source, on_done))
+
+    def close(self):
+        """Flush every queued job, stop the writer thread and return the failure count"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+            if self.failed:
+                logger.error(f"Neo4j writer finished with {self.failed} failed writes")
+        return self.failed
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            group = [job]
+            rows = job.rows
+            deadline = time.monotonic() + self.flush_interval
+            stopping = False
+            while len(group) < self.group_chunks and rows < self.group_rows:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    job = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                group.append(job)
+                rows += job.rows
+            self._commit(group)
+            if stopping:
+                return
+
+    def _commit(self, group):
+        try:
+            self.neo4j.write_chunk_results(
+                [(job.concepts, job.relationships, job.source) for job in group]
+            )
+            error = None
+            metrics.inc('write_groups')
+            metrics.inc('write_group_jobs', len(group))
+        except Exception as e:
+            if len(group) > 1:
+                logger.warning(f"Group write of {len(group)} jobs failed, retrying them one by one: {e}")
+                for job in group:
+                    self._commit([job])
+                return
+            error = e
+            self.failed += 1
+        for job in group:
+            if job.on_done is None:
+                continue
+            try:
+                job.on_done(error)
+            except Exception as e:
+                logger.error(f"Write completion callback failed: {e}")